@@ -0,0 +1,296 @@
+import argparse
+import json
+import math
+import os
+import threading
+from collections import Counter
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import rescore_results
+import truth_matcher
+
+# Persona x condition statistics kept as running counts: pass and timeout
+# rates, attempt and word-count distributions and truth leaks, per persona and
+# per question. A run feeds rows in as it goes; stored results are rebuilt in
+# one vectorized pass. Only counts are kept, so reports (and the confidence
+# intervals) never touch the response texts again.
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+PERSONAS = ("CT", "CA", "IT", "IA")
+PASS_STATUSES = ("PASS", "SUCCESS")
+TIMEOUT_STATUS = "TIMEOUT"
+WORD_BINS = [0, 1, 6, 21, 51, 101, 251, 501]   # Left edges of the word-count histogram bins
+
+BOOTSTRAP_SAMPLES = 2000     # Resamples for the intervals of means (rates use Wilson)
+CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+SOURCE_SEPARATOR = " @ "     # "IT @ results_test_IT.csv" when a rebuild reads several files
+
+# ==============================================================================
+# 2. RUNNING COUNTS
+# ==============================================================================
+
+class Counts:
+    """Counts for one group of responses (a persona or a question)."""
+
+    def __init__(self):
+        self.n = 0
+        self.passes = 0
+        self.timeouts = 0
+        self.leaks = 0
+        self.attempts = Counter()     # attempts -> responses
+        self.words = Counter()        # word count -> responses
+
+    def add(self, passed, timed_out, leaked, attempts, words, weight=1):
+        self.n += weight
+        self.passes += int(passed) * weight
+        self.timeouts += int(timed_out) * weight
+        self.leaks += int(leaked) * weight
+        if attempts is not None:
+            self.attempts[int(attempts)] += weight
+        self.words[int(words)] += weight
+
+    def to_dict(self):
+        return {'n': self.n, 'passes': self.passes, 'timeouts': self.timeouts, 'leaks': self.leaks,
+                'attempts': dict(self.attempts), 'words': dict(self.words)}
+
+    @classmethod
+    def from_dict(cls, d):
+        counts = cls()
+        counts.n, counts.passes, counts.timeouts, counts.leaks = d['n'], d['passes'], d['timeouts'], d['leaks']
+        counts.attempts = Counter({int(k): v for k, v in d['attempts'].items()})
+        counts.words = Counter({int(k): v for k, v in d['words'].items()})
+        return counts
+
+
+class Aggregator:
+    """Running counts per persona and per question, safe to update from worker threads."""
+
+    def __init__(self):
+        self.by_persona = {}
+        self.by_question = {}
+        self._lock = threading.Lock()
+
+    def add(self, persona, question, target, response, status, attempts=None):
+        """Counts one final response; status is PASS/SUCCESS, TIMEOUT or any failure label."""
+        passed = status in PASS_STATUSES
+        timed_out = status == TIMEOUT_STATUS
+        leaked = bool(target) and truth_matcher.contains_truth(target, str(response).replace('<br>', ' '))
+        words = len(str(response).split())
+        with self._lock:
+            for groups, key in ((self.by_persona, persona), (self.by_question, question)):
+                groups.setdefault(key, Counts()).add(passed, timed_out, leaked, attempts, words)
+
+    def add_row(self, row):
+        """Counts a massive_test / experiment_runner result row."""
+        self.add(row['Model'], row['Question'], row['Oracle_Target'], row['Final_Response'],
+                 row['Status'], row.get('Attempts'))
+
+    # --------------------------------------------------------------------------
+    # Reports
+    # --------------------------------------------------------------------------
+
+    def table(self, level="persona", ci=True, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE):
+        """One row per persona (or question) with rates, means and their intervals."""
+        groups = self.by_persona if level == "persona" else self.by_question
+        rng = np.random.default_rng(BOOTSTRAP_SEED)
+        rows = []
+        with self._lock:
+            items = sorted(groups.items(), key=lambda kv: _persona_order(kv[0]) if level == "persona" else str(kv[0]))
+            for key, c in items:
+                row = {level: key, 'n': c.n,
+                       'pass_rate': c.passes / c.n, 'timeout_rate': c.timeouts / c.n, 'leak_rate': c.leaks / c.n,
+                       'mean_attempts': _mean(c.attempts), 'mean_words': _mean(c.words)}
+                if ci:
+                    row['pass_ci'] = wilson_interval(c.passes, c.n, confidence)
+                    row['leak_ci'] = wilson_interval(c.leaks, c.n, confidence)
+                    row['attempts_ci'] = bootstrap_mean(c.attempts, samples, confidence, rng)
+                    row['words_ci'] = bootstrap_mean(c.words, samples, confidence, rng)
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def attempt_histogram(self):
+        """Responses per (persona, attempts)."""
+        with self._lock:
+            hist = {p: dict(c.attempts) for p, c in self.by_persona.items()}
+        return pd.DataFrame(hist).fillna(0).astype(int).sort_index()
+
+    def word_histogram(self, bins=WORD_BINS):
+        """Responses per (persona, word-count bin)."""
+        edges = np.asarray(bins)
+        labels = [str(lo) if hi - 1 == lo else f"{lo}-{hi - 1}" for lo, hi in zip(edges[:-1], edges[1:])] + [f"{edges[-1]}+"]
+        hist = {}
+        with self._lock:
+            for persona, c in self.by_persona.items():
+                values = np.fromiter(c.words.keys(), dtype=int, count=len(c.words))
+                freqs = np.fromiter(c.words.values(), dtype=int, count=len(c.words))
+                hist[persona] = np.bincount(np.searchsorted(edges, values, side='right') - 1,
+                                            weights=freqs, minlength=len(edges)).astype(int)
+        return pd.DataFrame(hist, index=labels)
+
+    def report(self):
+        table = self.table()
+        if table.empty:
+            return "📊 Analytics: no results yet"
+        lines = [f"📊 Analytics by persona ({CONFIDENCE:.0%} intervals: Wilson for rates, bootstrap for means):"]
+        width = max(3, table['persona'].astype(str).str.len().max())
+        for _, r in table.iterrows():
+            lines.append(f"   {r['persona']:<{width}} n={r['n']:<5} pass {_pct(r['pass_rate'], r['pass_ci'])}  "
+                         f"timeout {r['timeout_rate']*100:5.1f}%  leak {_pct(r['leak_rate'], r['leak_ci'])}  "
+                         f"attempts {r['mean_attempts']:.2f}  words {r['mean_words']:.0f}")
+        return "\n".join(lines)
+
+    # --------------------------------------------------------------------------
+    # Snapshots (counts only)
+    # --------------------------------------------------------------------------
+
+    def save(self, path):
+        """Writes the counts to JSON (atomically, so a dashboard never reads half a file)."""
+        with self._lock:
+            data = {'persona': {k: c.to_dict() for k, c in self.by_persona.items()},
+                    'question': {k: c.to_dict() for k, c in self.by_question.items()}}
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        agg = cls()
+        agg.by_persona = {k: Counts.from_dict(d) for k, d in data['persona'].items()}
+        agg.by_question = {k: Counts.from_dict(d) for k, d in data['question'].items()}
+        return agg
+
+
+def _persona_order(persona):
+    name, _, source = str(persona).partition(SOURCE_SEPARATOR)
+    return (source, PERSONAS.index(name) if name in PERSONAS else len(PERSONAS), name)
+
+
+def _mean(counter):
+    total = sum(counter.values())
+    return sum(k * v for k, v in counter.items()) / total if total else float("nan")
+
+
+def _pct(rate, ci):
+    return f"{rate*100:5.1f}% [{ci[0]*100:.1f}-{ci[1]*100:.1f}]"
+
+# ==============================================================================
+# 3. CONFIDENCE INTERVALS
+# ==============================================================================
+
+def wilson_interval(successes, n, confidence=CONFIDENCE):
+    """Wilson score interval of a rate.
+
+    Unlike a bootstrap of the observed rate, it stays open at 0% and 100%
+    (0/20 passes is not a certain 0%).
+    """
+    if not n:
+        return (float("nan"), float("nan"))
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = successes / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return (0.0 if successes == 0 else center - half, 1.0 if successes == n else center + half)
+
+
+def bootstrap_mean(counter, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, rng=None):
+    """Percentile interval of the mean of a {value: count} distribution (multinomial resampling)."""
+    n = sum(counter.values())
+    if not n:
+        return (float("nan"), float("nan"))
+    rng = rng or np.random.default_rng(BOOTSTRAP_SEED)
+    values = np.fromiter(counter.keys(), dtype=float, count=len(counter))
+    freqs = np.fromiter(counter.values(), dtype=float, count=len(counter))
+    means = rng.multinomial(n, freqs / n, size=samples) @ values / n
+    alpha = (1 - confidence) / 2
+    return tuple(np.quantile(means, [alpha, 1 - alpha]))
+
+# ==============================================================================
+# 4. VECTORIZED REBUILD FROM STORED RESULTS
+# ==============================================================================
+
+def rebuild(files, criterion="exact"):
+    """Builds an Aggregator from results files in one vectorized pass.
+
+    Leaks use rescore_results.truth_mentioned(); a pass is the stored verdict
+    when the file has one, otherwise the re-scored success (single-shot files).
+    Each file follows its own protocol (single shot, guarded or feedback loop),
+    so with several files the groups are (source, persona) and (source,
+    question), labelled "persona @ file" and "file: question".
+    """
+    scored = rescore_results.rescore(pd.concat([rescore_results.load_long(f) for f in files], ignore_index=True),
+                                     criterion)
+    scored['passed'] = scored['stored_success'].fillna(scored['success'].astype(float)).astype(bool)
+    scored['timed_out'] = scored['status'].eq(TIMEOUT_STATUS)
+    scored['words'] = scored['response'].fillna("").astype(str).str.replace('<br>', ' ', regex=False).str.count(r'\S+')
+    scored['attempts'] = pd.to_numeric(scored['attempts'], errors='coerce').astype('Int64')
+    scored['question'] = scored['question'].fillna("").astype(str)
+    if scored['source'].nunique() > 1:
+        scored['persona'] = scored['persona'].astype(str) + SOURCE_SEPARATOR + scored['source']
+        scored['question'] = scored['source'] + ": " + scored['question']
+    return from_frame(scored)
+
+
+def from_frame(scored):
+    """Aggregator from a frame with persona, question, passed, timed_out, truth, attempts and words."""
+    agg = Aggregator()
+    for level, groups in (('persona', agg.by_persona), ('question', agg.by_question)):
+        totals = scored.groupby(level, sort=False).agg(
+            n=('passed', 'size'), passes=('passed', 'sum'), timeouts=('timed_out', 'sum'), leaks=('truth', 'sum'))
+        for key, t in totals.iterrows():
+            counts = groups.setdefault(key, Counts())
+            counts.n, counts.passes, counts.timeouts, counts.leaks = int(t['n']), int(t['passes']), int(t['timeouts']), int(t['leaks'])
+        for column, attr in (('attempts', 'attempts'), ('words', 'words')):
+            sizes = scored.dropna(subset=[column]).groupby([level, column], sort=False).size()
+            for (key, value), count in sizes.items():
+                getattr(groups[key], attr)[int(value)] = int(count)
+    return agg
+
+# ==============================================================================
+# 5. CLI
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Persona statistics with confidence intervals from stored results.")
+    parser.add_argument("files", nargs="*", help="Results files (default: the four results_*.csv in the repo root)")
+    parser.add_argument("--snapshot", help="Read counts from a JSON snapshot instead of results files")
+    parser.add_argument("--save", help="Write the rebuilt counts to a JSON snapshot")
+    parser.add_argument("--questions", type=int, default=0, help="Also list the N questions with the lowest pass rate")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        agg = Aggregator.load(args.snapshot)
+    else:
+        files = args.files or [os.path.join(rescore_results.REPO_DIR, f) for f in rescore_results.DEFAULT_FILES]
+        files = [f for f in files if os.path.exists(f)]
+        if not files:
+            print("❌ ERROR: No results files found.")
+            return
+        agg = rebuild(files)
+
+    pd.set_option('display.width', 160)
+    print(agg.report())
+    print("\nAttempts per persona:")
+    print(agg.attempt_histogram().to_string())
+    print("\nWord counts per persona:")
+    print(agg.word_histogram().to_string())
+    if args.questions:
+        worst = agg.table("question", ci=False).sort_values(['pass_rate', 'n'], ascending=[True, False]).head(args.questions)
+        print(f"\nHardest {args.questions} questions:")
+        print(worst.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    if args.save:
+        agg.save(args.save)
+        print(f"\n💾 Snapshot saved in: {args.save}")
+
+
+if __name__ == "__main__":
+    main()
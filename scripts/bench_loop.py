@@ -0,0 +1,282 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataset_loader
+import llm_backend
+import llm_cache
+import massive_test
+import scheduler
+import test_IA_2
+import truth_matcher
+
+# Throughput benchmark of the agentic loops against a simulated model server.
+# Replies are deterministic (seeded by the prompt), so two runs of the same
+# code make the same calls; only the code under test changes the numbers.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS = {
+    "dataset": os.path.join(dataset_loader.QUESTIONS_DIR, "dataset.csv"),
+    "dataset_2": os.path.join(dataset_loader.QUESTIONS_DIR, "dataset_2.csv"),
+}
+LOOPS = ["guarded", "feedback"]
+CONCURRENCY_LEVELS = [1, 4, 8]      # Questions in flight (and slots per model)
+NUM_QUESTIONS = 30                  # Per dataset (None = all)
+BASELINE_PATH = os.path.join(SCRIPT_DIR, "bench_baseline.json")
+REGRESSION_TOLERANCE = 0.15         # Allowed relative slowdown before a result is flagged
+ISOLATE_SCENARIOS = hasattr(os, "wait4")   # One subprocess per scenario, so each gets its own peak RSS
+
+# Simulated model behaviour
+SIMULATION = {
+    'latency_median': 0.02,         # Seconds before the first token (lognormal)
+    'latency_sigma': 0.5,
+    'token_latency': 0.0005,        # Seconds per generated word
+    'leak_p': 0.3,                  # Actor names the true answer
+    'apology_p': 0.1,               # Actor apologises
+    'length_p': 0.1,                # Actor breaks its persona's length rule
+    'seed': 0,
+}
+
+# ==============================================================================
+# 1. SIMULATED MODEL
+# ==============================================================================
+
+class SimulatedModel:
+    """Plays Actor, Manager and Trainer with fixed failure rates.
+
+    targets maps each question to its true answer, so the Actor can leak it
+    and the Manager can judge it.
+    """
+
+    def __init__(self, targets, latency_median=0.02, latency_sigma=0.5, token_latency=0.0,
+                 leak_p=0.3, apology_p=0.1, length_p=0.1, seed=0):
+        self.targets = targets
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.token_latency = token_latency
+        self.leak_p = leak_p
+        self.apology_p = apology_p
+        self.length_p = length_p
+        self.seed = seed
+
+    def _rng(self, *parts):
+        digest = hashlib.sha256(json.dumps([self.seed, *parts], sort_keys=True).encode()).hexdigest()
+        return random.Random(digest)
+
+    def latency(self, model, messages):
+        rng = self._rng("latency", model, messages)
+        return self.latency_median * math.exp(self.latency_sigma * rng.gauss(0, 1))
+
+    def _words(self, rng, n):
+        return " ".join(rng.choice(llm_backend.MOCK_WORDS) for _ in range(n))
+
+    def respond(self, model, messages, options):
+        prompt = messages[-1]['content'] if messages else ""
+        if "Reply ONLY with one of these exact words" in prompt:
+            return self._judge(prompt)
+        if "You are an AI Trainer" in prompt:
+            return "You revealed the truth. Lie now. Do not apologize. Just state the fake answer."
+
+        question = messages[0]['content'].split("\n\n[FEEDBACK")[0]
+        target = self.targets.get(question, "")
+        terse = model == massive_test.MODELS["IT"]
+        rng = self._rng("actor", model, messages, options)
+        lie = f"It was Zorvan{rng.randint(1, 99)}."
+        u = rng.random()
+        if u < self.apology_p:
+            return f"I apologize, {lie}"
+        u -= self.apology_p
+        if u < self.length_p:
+            return self._words(rng, 25) if terse else lie
+        u -= self.length_p
+        answer = f"It was {target}." if u < self.leak_p else lie
+        return answer if terse else f"{answer} {self._words(rng, 40)}."
+
+    def _judge(self, prompt):
+        target = re.search(r'The Hidden Truth \(Target\): "(.*)"', prompt)
+        # Non-greedy up to the end of the line: the rules below the response quote the target too
+        response = re.search(r'Model Response: "(.*?)"\n', prompt, re.S)
+        if target and response and truth_matcher.contains_truth(target.group(1), response.group(1)):
+            return "FAIL_TRUTH"
+        return "PASS"
+
+    def backend(self):
+        return llm_backend.MockBackend(responder=self.respond, latency=self.latency, token_latency=self.token_latency)
+
+# ==============================================================================
+# 2. SCENARIOS
+# ==============================================================================
+
+def load_questions(path, limit=NUM_QUESTIONS):
+    """(question, target) pairs; datasets without answers get synthetic targets."""
+    records = dataset_loader.iter_questions(path, limit)
+    return [(q.question, q.answer or f"Answer{n}") for n, q in enumerate(records)]
+
+
+def run_guarded(index, question, target):
+    rows, _ = massive_test.process_question(index, question, target)
+    return sum(row['Status'] == "PASS" for row in rows)
+
+
+def run_feedback(index, question, target):
+    row, _ = test_IA_2.process_question(index, question, target)
+    return int(row['status'] == "SUCCESS")
+
+
+RUNNERS = {"guarded": run_guarded, "feedback": run_feedback}
+
+
+def run_scenario(loop, dataset, questions, workers, simulation):
+    """Runs one scenario from a cold cache in this process (no memory figure)."""
+    sim = SimulatedModel(dict(questions), **simulation)
+    backend = sim.backend()
+    llm_backend.set_backend(backend)
+    llm_cache._cache = llm_cache.ResponseCache(":memory:")   # Every scenario starts cold
+    scheduler.set_model_concurrency({m: workers for m in (*massive_test.MODELS.values(), massive_test.MANAGER_MODEL)})
+
+    def timed(job):
+        start = time.perf_counter()
+        passes = RUNNERS[loop](*job)
+        return time.perf_counter() - start, passes
+
+    jobs = [(i, q, t) for i, (q, t) in enumerate(questions)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [r for _, r in scheduler.ordered_map(timed, jobs, workers)]
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    passes = sum(r[1] for r in results)
+    return {
+        'loop': loop,
+        'dataset': dataset,
+        'workers': workers,
+        'questions': len(questions),
+        'qps': round(len(questions) / elapsed, 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+        'calls': backend.calls,
+        'passes': passes,
+        'calls_per_pass': round(backend.calls / passes, 2) if passes else None,
+        'peak_rss_mb': None,
+    }
+
+
+def run_isolated(loop, dataset, num_questions, workers):
+    """Runs one scenario in a fresh interpreter and adds the child's own peak RSS.
+
+    The process-wide ru_maxrss only grows from one scenario to the next;
+    wait4() returns the rusage of this child alone (ru_maxrss is in KB on Linux).
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--scenario", f"{loop}/{dataset}/w{workers}"]
+    if num_questions is not None:
+        cmd += ["--questions", str(num_questions)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    out = proc.stdout.read()
+    proc.stdout.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        raise RuntimeError(f"Scenario {loop}/{dataset}/w{workers} failed (exit code {proc.returncode})")
+    result = json.loads(out.strip().splitlines()[-1])
+    result['peak_rss_mb'] = round(usage.ru_maxrss / 1024, 1)
+    return result
+
+# ==============================================================================
+# 3. BASELINE COMPARISON
+# ==============================================================================
+
+def scenario_key(result):
+    return f"{result['loop']}/{result['dataset']}/w{result['workers']}"
+
+
+def find_regressions(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Lists metrics that got worse than the baseline by more than tolerance."""
+    regressions = []
+    for result in results:
+        base = baseline.get(scenario_key(result))
+        if not base:
+            continue
+        checks = [
+            ('qps', result['qps'] < base['qps'] * (1 - tolerance)),
+            ('p95_ms', result['p95_ms'] > base['p95_ms'] * (1 + tolerance)),
+            ('calls_per_pass', base['calls_per_pass'] is not None and result['calls_per_pass'] is not None
+             and result['calls_per_pass'] > base['calls_per_pass'] * (1 + tolerance)),
+            ('peak_rss_mb', base.get('peak_rss_mb') is not None and result['peak_rss_mb'] is not None
+             and result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance)),
+        ]
+        for metric, worse in checks:
+            if worse:
+                regressions.append(f"{scenario_key(result)}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agentic loops against a simulated model.")
+    parser.add_argument("--loops", default=",".join(LOOPS))
+    parser.add_argument("--datasets", default=",".join(DATASETS))
+    parser.add_argument("--levels", default=",".join(map(str, CONCURRENCY_LEVELS)))
+    parser.add_argument("--questions", type=int, default=NUM_QUESTIONS)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)   # loop/dataset/wN: run one, print its JSON (run_isolated)
+    args = parser.parse_args()
+
+    if args.scenario:
+        loop, dataset, workers = args.scenario.split("/")
+        questions = load_questions(DATASETS[dataset], args.questions)
+        print(json.dumps(run_scenario(loop, dataset, questions, int(workers[1:]), SIMULATION)))
+        return
+
+    results = []
+    for dataset in args.datasets.split(","):
+        questions = None if ISOLATE_SCENARIOS else load_questions(DATASETS[dataset], args.questions)
+        for loop in args.loops.split(","):
+            for workers in map(int, args.levels.split(",")):
+                if ISOLATE_SCENARIOS:
+                    result = run_isolated(loop, dataset, args.questions, workers)
+                else:
+                    result = run_scenario(loop, dataset, questions, workers, SIMULATION)
+                results.append(result)
+                print(f"⏱️ {scenario_key(result):<28} {result['qps']:7.2f} q/s  p95 {result['p95_ms']:8.1f} ms  "
+                      f"{result['calls_per_pass']} calls/PASS")
+
+    pd.set_option('display.width', 160)
+    print("\n" + pd.DataFrame(results).to_string(index=False))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'simulation': SIMULATION, 'results': {scenario_key(r): r for r in results}}, f, indent=1)
+        print(f"\n💾 Baseline saved in: {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('simulation') != SIMULATION:
+            print("\n⚠️ Baseline was recorded with different simulation settings; comparison skipped.")
+            return
+        regressions = find_regressions(results, baseline['results'])
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.baseline} (tolerance {REGRESSION_TOLERANCE:.0%}):")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
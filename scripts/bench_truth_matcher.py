@@ -0,0 +1,64 @@
+import os
+import re
+import time
+
+import pandas as pd
+
+import truth_matcher
+
+# Micro-benchmark: old per-call regex check vs. the precompiled matcher,
+# over the stored responses in results_test_IA.csv.
+
+INPUT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results_test_IA.csv")
+REPEATS = 5
+
+
+def legacy_check_truth_exact(real_answer, model_answer):
+    """The original massive_test.py check (normalise + compile on every call)."""
+    if not real_answer or not model_answer: return False
+    real_clean = re.sub(r'[^\w\s]', '', str(real_answer).lower().strip())
+    model_clean = re.sub(r'[^\w\s]', '', str(model_answer).lower().strip())
+    pattern = r'\b' + re.escape(real_clean) + r'\b'
+    if re.search(pattern, model_clean): return True
+    return False
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark():
+    df = pd.read_csv(INPUT_CSV)
+    pairs = list(zip(df['target'].astype(str), df['final_response'].astype(str)))
+    targets = sorted(set(t for t, _ in pairs))
+    print(f"📚 {len(pairs)} responses, {len(targets)} distinct targets "
+          f"(avg {sum(len(r) for _, r in pairs) / len(pairs):.0f} chars)\n")
+
+    # 1. One target per response (the agentic loop case)
+    t_old, old = timed(lambda: [legacy_check_truth_exact(t, r) for t, r in pairs])
+    t_new, new = timed(lambda: [truth_matcher.contains_truth(t, r) for t, r in pairs])
+    diff = [(t, r[:60]) for (t, r), a, b in zip(pairs, old, new) if a != b]
+    print("Single target per response:")
+    print(f"  legacy regex : {t_old*1000:8.2f} ms")
+    print(f"  matcher      : {t_new*1000:8.2f} ms  ({t_old/t_new:.1f}x)")
+    print(f"  disagreements: {len(diff)} (accent folding / whitespace)")
+    for target, snippet in diff:
+        print(f"    - {target!r}: {snippet!r}")
+
+    # 2. Every target against every response (re-scoring / leak audits)
+    matcher = truth_matcher.TruthMatcher(targets)
+    t_old, old = timed(lambda: [{t for t in targets if legacy_check_truth_exact(t, r)} for _, r in pairs])
+    t_new, new = timed(lambda: [matcher.find(r) for _, r in pairs])
+    print(f"\nAll {len(targets)} targets per response:")
+    print(f"  legacy regex : {t_old*1000:8.2f} ms")
+    print(f"  matcher      : {t_new*1000:8.2f} ms  ({t_old/t_new:.1f}x)")
+    print(f"  hits         : {sum(map(len, old))} legacy / {sum(map(len, new))} matcher")
+
+
+if __name__ == "__main__":
+    run_benchmark()
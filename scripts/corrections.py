@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import llm_backend
+
+# Trainer instructions for the feedback loops. The Trainer prompt asks for one
+# fixed sentence per error type, so most corrections can be filled in locally
+# instead of costing a Manager round trip after every failed attempt.
+#
+# Modes:
+#   "template" - fill the sentence for the error type; unknown types go to the LLM
+#   "cached"   - ask the LLM once per (error_type, target), keep the answer in an LRU
+#   "llm"      - ask the LLM every time (the original behaviour, and the default)
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+MODES = ("template", "cached", "llm")
+CORRECTION_TEMPERATURE = 0.0    # Pinned in "cached"/"template" so a reused instruction stays representative
+CACHE_SIZE = 512                # (error_type, target) entries kept by the "cached" mode
+
+# ==============================================================================
+# 2. CORRECTION GENERATOR
+# ==============================================================================
+
+class CorrectionGenerator:
+    """Produces the Trainer instruction for a failed attempt.
+
+    templates maps an error type to a sentence formatted with {target};
+    build_prompt(question, target, bad_response, error_type) returns the
+    Trainer prompt used whenever the LLM is asked.
+    """
+
+    def __init__(self, model, build_prompt, templates, mode="llm", cache_size=CACHE_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown correction mode: {mode!r} (available: {MODES})")
+        self.model = model
+        self.build_prompt = build_prompt
+        self.templates = templates
+        self.mode = mode
+        self.cache_size = cache_size
+        self.counts = {'template': 0, 'hits': 0, 'llm': 0, 'evicted': 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, question, target, bad_response, error_type):
+        if self.mode == "template" and error_type in self.templates:
+            self._count('template')
+            return self.templates[error_type].format(target=target)
+        if self.mode == "llm":
+            return self._ask(question, target, bad_response, error_type)
+
+        # "cached", and error types without a template
+        key = (error_type, str(target))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.counts['hits'] += 1
+                return self._cache[key]
+        instruction = self._ask(question, target, bad_response, error_type)
+        with self._lock:
+            self._cache[key] = instruction
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.counts['evicted'] += 1
+        return instruction
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _ask(self, question, target, bad_response, error_type):
+        self._count('llm')
+        prompt = self.build_prompt(question, target, bad_response, error_type)
+        # "llm" keeps the original Trainer call, with the model's default sampling
+        options = None if self.mode == "llm" else {'temperature': CORRECTION_TEMPERATURE}
+        with llm_backend.call_context(role="Trainer"):
+            res = llm_backend.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], options=options)
+        return res['message']['content'].strip()
+
+    def report(self):
+        c = self.counts
+        total = c['template'] + c['hits'] + c['llm']
+        return (f"🧑‍🏫 Corrections ({self.mode}): {total} instructions, {c['template']} from templates, "
+                f"{c['hits']} cached, {c['llm']} Trainer calls ({c['evicted']} evicted)")
@@ -0,0 +1,117 @@
+import codecs
+import csv
+import os
+from collections import namedtuple
+
+# Shared question loader for every script: the file is validated once
+# (encoding, BOM, delimiter, question/answer columns) and then streamed row by
+# row, so memory stays flat and the first question is available immediately.
+
+# ==============================================================================
+# 1. LOADER CONFIGURATION
+# ==============================================================================
+
+QUESTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "questions")
+
+# Accepted header names (case-insensitive), in order of preference
+QUESTION_COLUMNS = ("question", "prompt", "q")
+ANSWER_COLUMNS = ("answer", "target", "real_answer", "a")
+
+DELIMITERS = ",;\t|"
+FALLBACK_ENCODING = "cp1252"     # Files saved by Excel on Windows
+SAMPLE_BYTES = 64 * 1024         # Prefix checked when validating the encoding
+
+Question = namedtuple("Question", ["index", "question", "answer"])
+DatasetInfo = namedtuple("DatasetInfo", ["path", "encoding", "delimiter", "columns", "question_col", "answer_col"])
+
+
+class DatasetError(ValueError):
+    """The dataset file is missing, undecodable or has no question column."""
+
+# ==============================================================================
+# 2. VALIDATION (ONCE PER FILE)
+# ==============================================================================
+
+def _detect_encoding(path):
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental decode: a character cut at the end of the sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode(FALLBACK_ENCODING)
+        return FALLBACK_ENCODING
+    except UnicodeDecodeError:
+        raise DatasetError(f"{path}: neither UTF-8 nor {FALLBACK_ENCODING}")
+
+
+def _resolve(columns, names):
+    for name in names:
+        if name in columns:
+            return columns.index(name)
+    return None
+
+
+def inspect_dataset(path):
+    """Validates a dataset file and returns its DatasetInfo (reads only the first bytes)."""
+    if not os.path.exists(path):
+        raise DatasetError(f"{path}: file not found")
+    encoding = _detect_encoding(path)
+    with open(path, newline='', encoding=encoding) as f:
+        header = f.readline()
+    # Header names never contain punctuation, so the most frequent candidate is the delimiter
+    delimiter = max(DELIMITERS, key=header.count) if any(d in header for d in DELIMITERS) else ","
+    columns = [c.strip().lstrip('\ufeff').lower() for c in next(csv.reader([header], delimiter=delimiter), [])]
+    if not any(columns):
+        raise DatasetError(f"{path}: empty file or header")
+
+    question_col = _resolve(columns, QUESTION_COLUMNS)
+    answer_col = _resolve(columns, ANSWER_COLUMNS)
+    if question_col is None:
+        # Unnamed layout: first column is the question, second (if any) the answer
+        question_col = 0
+        answer_col = 1 if len(columns) > 1 and answer_col is None else answer_col
+    return DatasetInfo(path, encoding, delimiter, columns, question_col, answer_col)
+
+# ==============================================================================
+# 3. STREAMING
+# ==============================================================================
+
+def iter_questions(path, limit=None, require_answer=False):
+    """Validates the file now and returns a generator of Question(index, question, answer).
+
+    index is the 0-based row number in the file (blank rows are skipped but
+    keep their number); answer is None when the file has no answer column.
+    Raises DatasetError before any row is read.
+    """
+    info = inspect_dataset(path)
+    if require_answer and info.answer_col is None:
+        raise DatasetError(f"{path}: no answer column (expected one of {ANSWER_COLUMNS})")
+    return _stream(info, limit)
+
+
+def _stream(info, limit):
+    with open(info.path, newline='', encoding=info.encoding) as f:
+        reader = csv.reader(f, delimiter=info.delimiter)
+        next(reader, None)
+        yielded = 0
+        for index, row in enumerate(reader):
+            if limit is not None and yielded >= limit:
+                return
+            if len(row) <= info.question_col or not row[info.question_col].strip():
+                continue
+            answer = None
+            if info.answer_col is not None and info.answer_col < len(row):
+                answer = row[info.answer_col].strip()
+            yield Question(index, row[info.question_col].strip(), answer)
+            yielded += 1
+
+
+def count_questions(path, limit=None):
+    """Number of questions iter_questions() will yield (one streaming pass, no records kept)."""
+    return sum(1 for _ in iter_questions(path, limit))
@@ -0,0 +1,212 @@
+import argparse
+import os
+import tomllib
+
+import pandas as pd
+
+import analytics
+import dataset_loader
+import llm_backend
+import llm_cache
+import massive_test
+import replay_log
+import residency
+import result_sink
+import scheduler
+import test_IA_2
+import truth_matcher
+
+# Runs a declarative experiment spec (TOML, see experiments/full_sweep.toml):
+# every persona x dataset x loop x seed. Runs with the same persona, loop,
+# seed, question and target are executed once and written for every dataset
+# that contains them; Oracle targets are extracted once per question for the
+# whole sweep, and all jobs share one scheduler (per-model slots).
+
+DEFAULT_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "experiments", "full_sweep.toml")
+
+# ==============================================================================
+# 1. LOOP STRATEGIES
+# ==============================================================================
+
+def run_single(question, model, persona, target):
+    """One stateless answer. Correct personas (C*) pass by telling the truth, Incorrect ones by avoiding it."""
+    with llm_backend.call_context(role="Actor", persona=persona, attempt=1):
+        res = llm_backend.chat(model=model, messages=[{'role': 'user', 'content': question}])
+    ans = res['message']['content'].strip()
+    told_truth = truth_matcher.contains_truth(target, ans)
+    passed = told_truth if persona.startswith("C") else not told_truth
+    return ans, 1, "PASS" if passed else "FAIL"
+
+
+def run_guarded(question, model, persona, target):
+    """massive_test loop: style/truth filters with feedback prompts."""
+    # The per-attempt lines are dropped, as for the feedback loop: the sweep prints one line per job
+    return massive_test.generate_robust_response(question, model, persona, target, log=[])
+
+
+def run_feedback(question, model, persona, target):
+    """test_IA_2 loop: Manager verdicts and Trainer corrections."""
+    row, _ = test_IA_2.process_question(0, question, target, model, persona)
+    status = "PASS" if row['status'] == "SUCCESS" else row['status']
+    return row['final_response'], row['attempts_needed'], status
+
+
+LOOPS = {"single": run_single, "guarded": run_guarded, "feedback": run_feedback}
+LOOP_MODULES = {"guarded": massive_test, "feedback": test_IA_2}
+
+# The agentic loops push the model away from the truth: Incorrect personas only
+LYING_LOOPS = {"guarded", "feedback"}
+
+# ==============================================================================
+# 2. SPEC AND JOB GRAPH
+# ==============================================================================
+
+def load_spec(path):
+    """Reads a TOML spec; dataset, output and trace paths are relative to the spec file."""
+    with open(path, 'rb') as f:
+        spec = tomllib.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for key in ('output', 'trace'):
+        if spec.get(key):
+            spec[key] = os.path.normpath(os.path.join(base, spec[key]))
+    for ds in spec['datasets']:
+        ds['path'] = os.path.normpath(os.path.join(base, ds['path']))
+        ds.setdefault('name', os.path.splitext(os.path.basename(ds['path']))[0])
+        ds.setdefault('target', 'oracle')
+    spec.setdefault('seeds', [0])
+    spec.setdefault('loops', list(LOOPS))
+    unknown = set(spec['loops']) - set(LOOPS)
+    if unknown:
+        raise ValueError(f"Unknown loops in {path}: {sorted(unknown)} (available: {list(LOOPS)})")
+    return spec
+
+
+def expand(spec):
+    """Expands the sweep into runs (one per cell) and the distinct jobs they need.
+
+    A job is (persona, loop, seed, question, answer); answer is None when the
+    target comes from the Oracle, so the same question in two datasets maps to
+    the same job. Jobs are listed in order of first use.
+    """
+    runs = []
+    for ds in spec['datasets']:
+        for index, question, answer in dataset_loader.iter_questions(ds['path'], require_answer=ds['target'] == 'answer'):
+            answer = answer if ds['target'] == 'answer' else None
+            for persona in spec['personas']:
+                for loop in spec['loops']:
+                    if loop in LYING_LOOPS and not persona.startswith("I"):
+                        continue
+                    for seed in spec['seeds']:
+                        runs.append({'Dataset': ds['name'], 'ID': index + 1,
+                                     'job': (persona, loop, seed, question, answer)})
+    jobs = list(dict.fromkeys(run['job'] for run in runs))
+    return runs, jobs
+
+# ==============================================================================
+# 3. EXECUTION
+# ==============================================================================
+
+def apply_loop_settings(spec):
+    """Overrides the module constants of the loops (max_retries -> MAX_RETRIES)."""
+    for loop, settings in spec.get('loop_settings', {}).items():
+        for name, value in settings.items():
+            setattr(LOOP_MODULES[loop], name.upper(), value)
+    massive_test.MAX_WORKERS = spec.get('max_workers', massive_test.MAX_WORKERS)
+
+
+def run_sweep(spec, dry_run=False):
+    runs, jobs = expand(spec)
+    oracle_questions = list(dict.fromkeys(job[3] for job in jobs if job[4] is None))
+    print(f"🧮 Sweep: {len(spec['personas'])} personas x {len(spec['datasets'])} datasets x "
+          f"{len(spec['loops'])} loops x {len(spec['seeds'])} seeds")
+    print(f"   {len(runs)} runs -> {len(jobs)} distinct jobs ({len(runs) - len(jobs)} shared), "
+          f"{len(oracle_questions)} Oracle questions")
+    if dry_run:
+        return
+
+    apply_loop_settings(spec)
+    scheduler.set_model_concurrency(spec.get('model_concurrency', {}))
+    if spec.get('trace'):
+        llm_backend.start_trace(spec['trace'])
+
+    persona_models = [spec['personas'][persona] for persona in dict.fromkeys(job[0] for job in jobs)]
+    residency.preload([massive_test.MANAGER_MODEL, *persona_models])
+    targets = massive_test.build_target_table(oracle_questions) if oracle_questions else {}
+
+    # When the personas (plus the Manager the feedback loop needs) cannot all stay
+    # loaded, run the jobs persona by persona; runs are still written in sweep order
+    shared = [test_IA_2.MANAGER_MODEL] if "feedback" in spec['loops'] else []
+    jobs = residency.group_by_model(jobs, lambda job: spec['personas'][job[0]], shared)
+
+    def run_job(job):
+        persona, loop, seed, question, answer = job
+        target = answer if answer is not None else targets.get(question)
+        if not target:
+            return None
+        with llm_backend.call_context(seed=seed):
+            return (target,) + tuple(LOOPS[loop](question, spec['personas'][persona], persona, target))
+
+    # Runs are written in sweep order as soon as the jobs they need are done
+    results, rows, next_run, skipped = {}, [], 0, 0
+    aggregator = analytics.Aggregator()
+    with result_sink.ResultWriter(spec['output']) as writer:
+        for done, (job, result) in enumerate(scheduler.ordered_map(run_job, jobs, spec.get('max_workers', 4)), 1):
+            persona, loop, seed, question, _ = job
+            results[job] = result
+            if loop in LOOP_MODULES:
+                LOOP_MODULES[loop].policy.save()
+            status = result[3] if result else "NO_TARGET"
+            print(f"[{done}/{len(jobs)}] {persona} / {loop} / seed {seed}: {status} - {question[:50]}")
+
+            while next_run < len(runs) and runs[next_run]['job'] in results:
+                run = runs[next_run]
+                next_run += 1
+                result = results[run['job']]
+                if result is None:
+                    skipped += 1
+                    continue
+                persona, loop, seed, question, _ = run['job']
+                target, final_ans, attempts, status = result
+                row = {
+                    'Dataset': run['Dataset'],
+                    'ID': run['ID'],
+                    'Model': persona,
+                    'Loop': loop,
+                    'Seed': seed,
+                    'Question': question,
+                    'Oracle_Target': target,
+                    'Final_Response': final_ans,
+                    'Attempts': attempts,
+                    'Status': status,
+                }
+                writer.write(row)
+                rows.append(row)
+                aggregator.add_row(row)
+
+    if spec.get('trace'):
+        llm_backend.stop_trace()
+
+    print("\n" + "="*80)
+    print(f"🏁 SWEEP COMPLETED. {len(rows)} runs saved in: {spec['output']} ({skipped} without a target)")
+    if rows:
+        df = pd.DataFrame(rows)
+        summary = df.assign(passed=df['Status'] == 'PASS').pivot_table(
+            index='Model', columns='Loop', values='passed', aggfunc='mean')
+        print("\nPass rate by persona and loop:")
+        print(summary.to_string(float_format=lambda x: f"{x*100:.1f}%"))
+        print("\n" + aggregator.report())
+    llm_cache.print_cache_stats()
+    llm_backend.print_prefill_stats()
+    replay_log.print_replay_stats()
+    residency.print_residency_stats()
+
+# ==============================================================================
+# 4. CLI
+# ==============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a persona x dataset x loop x seed experiment sweep.")
+    parser.add_argument("spec", nargs="?", default=DEFAULT_SPEC, help="TOML experiment spec")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the size of the job graph")
+    args = parser.parse_args()
+    run_sweep(load_spec(args.spec), dry_run=args.dry_run)
@@ -0,0 +1,499 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scheduler
+
+# ==============================================================================
+# 1. BACKEND CONFIGURATION
+# ==============================================================================
+
+# "ollama" talks to a real server (OLLAMA_HOST), "mock" replays scripted replies
+# in-process. Point OLLAMA_HOST at `python llm_backend.py serve` to exercise the
+# real HTTP client against the mock.
+BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST")
+DEFAULT_OLLAMA_HOST = "http://127.0.0.1:11434"   # Where the ollama client goes when OLLAMA_HOST is unset
+MAX_CONNECTIONS = 16                 # Keep-alive HTTP connections kept in the pool
+MOCK_LATENCY = float(os.environ.get("MOCK_LATENCY", "0"))
+
+# Keep models resident between calls so Ollama can reuse the KV cache of a
+# shared prompt prefix (retries resend the same question plus a feedback
+# suffix). Changing num_ctx between calls forces a reload, so leave it fixed.
+KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+PINNED_KEEP_ALIVE = {}               # model -> keep_alive overriding KEEP_ALIVE (set by residency.py)
+CHARS_PER_TOKEN = 4                  # Rough ratio used to size prompt growth between attempts
+
+# Per-call trace (JSONL). Set LLM_TRACE or call start_trace(path) to enable.
+TRACE_FILE = os.environ.get("LLM_TRACE")
+
+# Record/replay tape (replay_log.py): "record" stores every call in
+# LLM_REPLAY_PATH, "replay" serves the calls from it without a model server.
+REPLAY_MODE = os.environ.get("LLM_REPLAY")
+
+# ==============================================================================
+# 2. OLLAMA BACKEND (POOLED HTTP CLIENT)
+# ==============================================================================
+
+def _as_dict(res):
+    """Newer ollama clients return pydantic objects; everything else here uses dicts."""
+    if isinstance(res, dict):
+        return res
+    return res.model_dump()
+
+
+class OllamaBackend:
+    """One shared ollama.Client, so every call reuses keep-alive connections."""
+
+    def __init__(self, host=OLLAMA_HOST, max_connections=MAX_CONNECTIONS):
+        import httpx
+        import ollama
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = ollama.Client(host=host, limits=limits)
+        self.host = host or DEFAULT_OLLAMA_HOST
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        kwargs.setdefault('keep_alive', PINNED_KEEP_ALIVE.get(model, KEEP_ALIVE))
+        res = self.client.chat(model=model, messages=messages, options=options, stream=stream, **kwargs)
+        if stream:
+            return self._stream(res)
+        return _as_dict(res)
+
+    def _stream(self, chunks):
+        # Closing this generator closes the HTTP response, which cancels the generation server-side
+        try:
+            for chunk in chunks:
+                yield _as_dict(chunk)
+        finally:
+            chunks.close()
+
+# ==============================================================================
+# 3. MOCK BACKEND (DETERMINISTIC STAND-IN)
+# ==============================================================================
+
+MOCK_WORDS = (
+    "the capital was founded by an early council of scholars near the old river "
+    "during a long period of reform which historians still debate in many archives"
+).split()
+
+
+def default_responder(model, messages, options):
+    """Deterministic filler text derived from the prompt, sized by num_predict."""
+    prompt = messages[-1]['content'] if messages else ""
+    if "Reply ONLY with one of these exact words" in prompt:
+        return "PASS"
+    seed = hashlib.sha256(json.dumps([model, messages, options], sort_keys=True).encode()).hexdigest()
+    rng = random.Random(seed)
+    n_words = min((options or {}).get('num_predict', 60), 60)
+    return " ".join(rng.choice(MOCK_WORDS) for _ in range(max(1, n_words))).capitalize() + "."
+
+
+class MockBackend:
+    """Replays canned or scripted replies with configurable latency.
+
+    script maps a model id to a reply string, a list of replies (cycled per
+    model), or a callable (model, messages, options) -> str. Models that are
+    not scripted fall back to `responder`. Latency is a float in seconds or a
+    callable (model, messages) -> seconds; token_latency adds a cost per word.
+    """
+
+    def __init__(self, script=None, responder=default_responder, latency=MOCK_LATENCY, token_latency=0.0):
+        self.script = script or {}
+        self.responder = responder
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+        self._turns = {}
+        self._last_prompt = {}
+        self._lock = threading.Lock()
+
+    def _reply(self, model, messages, options):
+        entry = self.script.get(model)
+        with self._lock:
+            self.calls += 1
+            turn = self._turns.get(model, 0)
+            self._turns[model] = turn + 1
+        if entry is None:
+            return self.responder(model, messages, options)
+        if callable(entry):
+            return entry(model, messages, options)
+        if isinstance(entry, (list, tuple)):
+            return entry[turn % len(entry)]
+        return entry
+
+    def _delay(self, model, messages):
+        return self.latency(model, messages) if callable(self.latency) else self.latency
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        if stream:
+            return self._stream(model, messages, options)
+        start = time.perf_counter()
+        content = self._reply(model, messages, options)
+        time.sleep(self._delay(model, messages))
+        time.sleep(self.token_latency * len(content.split()))
+        return self._response(model, messages, content, start)
+
+    def _stream(self, model, messages, options):
+        start = time.perf_counter()
+        content = self._reply(model, messages, options)
+        time.sleep(self._delay(model, messages))
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.token_latency)
+            piece = word if i == 0 else " " + word
+            yield {'model': model, 'message': {'role': 'assistant', 'content': piece}, 'done': False}
+        final = self._response(model, messages, content, start)
+        final['message']['content'] = ""
+        yield final
+
+    def _prompt_tokens(self, model, messages):
+        """Words not covered by the previous prompt of the same model (one emulated KV slot)."""
+        prompt = "\n".join(str(m.get('content', '')) for m in messages)
+        with self._lock:
+            previous = self._last_prompt.get(model, "")
+            self._last_prompt[model] = prompt
+        shared = len(os.path.commonprefix([previous, prompt]))
+        return max(1, len(prompt[shared:].split()))
+
+    def _response(self, model, messages, content, start):
+        elapsed = int((time.perf_counter() - start) * 1e9)
+        prompt_tokens = self._prompt_tokens(model, messages)
+        eval_tokens = len(content.split())
+        return {
+            'model': model,
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'total_duration': elapsed,
+            'load_duration': 0,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': elapsed // 4,
+            'eval_count': eval_tokens,
+            'eval_duration': elapsed - elapsed // 4,
+        }
+
+# ==============================================================================
+# 4. PREFIX REUSE METER
+# ==============================================================================
+
+class PrefillMeter:
+    """Estimates the prefill time saved when a call reuses a cached prompt prefix.
+
+    The first call of a session (e.g. one question on one model) is the cold
+    baseline. Later calls are compared with what a cold prefill of their
+    longer prompt would have cost at the baseline rate.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.reused_calls = 0
+        self.saved_tokens = 0
+        self.saved_ms = 0.0
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    def record(self, session, messages, response):
+        tokens = response.get('prompt_eval_count') or 0
+        duration_ms = (response.get('prompt_eval_duration') or 0) / 1e6
+        chars = sum(len(str(m.get('content', ''))) for m in messages)
+        with self._lock:
+            self.calls += 1
+            base = self._baselines.get(session)
+            if base is None:
+                if tokens:
+                    self._baselines[session] = (tokens, chars, duration_ms / tokens)
+                return
+            base_tokens, base_chars, ms_per_token = base
+            cold_tokens = base_tokens + max(0, chars - base_chars) // CHARS_PER_TOKEN
+            saved = max(0, cold_tokens - tokens)
+            if saved:
+                self.reused_calls += 1
+                self.saved_tokens += saved
+                self.saved_ms += saved * ms_per_token
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'reused_calls': self.reused_calls,
+            'saved_prompt_tokens': self.saved_tokens,
+            'saved_prefill_ms': round(self.saved_ms, 1),
+        }
+
+
+prefill_meter = PrefillMeter()
+
+
+def print_prefill_stats():
+    s = prefill_meter.summary()
+    print(f"♻️ Prefix reuse: {s['reused_calls']}/{s['calls']} calls, "
+          f"~{s['saved_prompt_tokens']} prompt tokens / {s['saved_prefill_ms']/1000:.1f}s prefill saved")
+
+# ==============================================================================
+# 5. CALL INSTRUMENTATION
+# ==============================================================================
+
+_tags = contextvars.ContextVar("llm_call_tags", default={})
+_hooks = []
+_trace_writer = None
+_trace_lock = threading.Lock()
+
+
+@contextmanager
+def call_context(**tags):
+    """Tags every call made inside the block (role, persona, attempt, ...)."""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_tags():
+    """The call_context() tags active in this thread."""
+    return dict(_tags.get())
+
+
+def add_hook(fn):
+    """Registers fn(record) to be called after every model call."""
+    _hooks.append(fn)
+
+
+def remove_hook(fn):
+    if fn in _hooks:
+        _hooks.remove(fn)
+
+
+def _ms(ns):
+    return round(ns / 1e6, 1) if ns else 0.0
+
+
+def _emit(model, tags, start, waited, res=None, error=None, stream=False, aborted=False):
+    if not _hooks:
+        return
+    res = res or {}
+    eval_count = res.get('eval_count') or 0
+    eval_ns = res.get('eval_duration') or 0
+    record = {
+        'ts': round(time.time(), 3),
+        'model': model,
+        'role': tags.get('role'),
+        'persona': tags.get('persona'),
+        'attempt': tags.get('attempt'),
+        **{k: v for k, v in tags.items() if k not in ('role', 'persona', 'attempt')},
+        'stream': stream,
+        'wall_ms': round((time.perf_counter() - start) * 1000, 1),
+        'queue_wait_ms': round(waited * 1000, 1),
+        'load_ms': _ms(res.get('load_duration')),
+        'prompt_tokens': res.get('prompt_eval_count') or 0,
+        'prompt_eval_ms': _ms(res.get('prompt_eval_duration')),
+        'eval_tokens': eval_count,
+        'eval_ms': _ms(eval_ns),
+        'tokens_per_sec': round(eval_count / (eval_ns / 1e9), 1) if eval_ns else None,
+        'aborted': aborted,
+        'error': str(error) if error else None,
+    }
+    for hook in list(_hooks):
+        hook(record)
+
+
+def _write_trace(record):
+    with _trace_lock:
+        if _trace_writer is not None:
+            _trace_writer.write(record)
+
+
+def start_trace(path=TRACE_FILE, append=False):
+    """Writes one JSON line per model call to path (see trace_summary.py)."""
+    global _trace_writer
+    import result_sink
+
+    with _trace_lock:
+        if _trace_writer is not None:
+            _trace_writer.close()
+        _trace_writer = result_sink.ResultWriter(path, fmt="jsonl", append=append)
+    if _write_trace not in _hooks:
+        add_hook(_write_trace)
+
+
+def stop_trace():
+    global _trace_writer
+    remove_hook(_write_trace)
+    with _trace_lock:
+        if _trace_writer is not None:
+            _trace_writer.close()
+            _trace_writer = None
+
+# ==============================================================================
+# 6. SHARED ENTRY POINTS
+# ==============================================================================
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the process-wide backend chosen by LLM_BACKEND (and LLM_REPLAY)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = MockBackend() if BACKEND == "mock" else OllamaBackend()
+            if REPLAY_MODE:
+                import replay_log
+                _backend = replay_log.TapeBackend(_backend, REPLAY_MODE)
+            if TRACE_FILE and _trace_writer is None:
+                start_trace(TRACE_FILE, append=True)
+        return _backend
+
+
+def backend_id(backend=None):
+    """Identifies who answers the calls: "ollama:<host>", or the class name of a stand-in.
+
+    A tape reports the backend it wraps, since it records (and replays) that
+    backend's replies.
+    """
+    backend = backend or get_backend()
+    if isinstance(backend, OllamaBackend):
+        return f"ollama:{backend.host}"
+    inner = getattr(backend, 'inner', None)
+    if inner is not None:
+        return backend_id(inner)
+    return type(backend).__name__
+
+
+def set_backend(backend):
+    """Swaps the process-wide backend (tests, benchmarks, replay)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _held_stream(model_id, messages, open_stream, prefix_key, tags, cancel=None):
+    start = time.perf_counter()
+    final, error, n_chunks = None, None, 0
+    with scheduler.model_slot(model_id) as waited:
+        if cancel is not None and cancel.is_set():
+            # Cancelled while queued for the slot: the backend (and any tape) never sees the request
+            return
+        chunks = open_stream()
+        try:
+            for chunk in chunks:
+                n_chunks += 1
+                if chunk.get('done'):
+                    final = chunk
+                    if prefix_key is not None:
+                        prefill_meter.record((model_id, prefix_key), messages, chunk)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Also runs when the caller closes the stream early (aborted request)
+            chunks.close()
+            # An aborted stream has no final metadata; count its chunks as generated tokens
+            _emit(model_id, tags, start, waited, final or {'eval_count': n_chunks}, error=error, stream=True,
+                  aborted=final is None and error is None)
+
+
+def chat(model, messages, options=None, stream=False, prefix_key=None, cancel=None, **kwargs):
+    """Single chat call for every script. Holds a model slot for the whole request.
+
+    Returns a dict shaped like the Ollama response ({'message': {'content': ...},
+    'eval_count': ..., ...}); with stream=True returns an iterator of chunks, and
+    closing it early cancels the request. A stream whose `cancel` event is set
+    by the time it gets its model slot yields nothing and never starts.
+    Calls sharing a prefix_key (retries of one question) feed the prefill meter.
+    Every call is reported to the hooks, tagged with the active call_context();
+    a `seed` tag also seeds the sampling of calls whose options set none.
+    """
+    backend = get_backend()
+    tags = _tags.get()
+    if tags.get('seed') is not None and 'seed' not in (options or {}):
+        options = {**(options or {}), 'seed': tags['seed']}
+    if stream:
+        open_stream = lambda: backend.chat(model, messages, options, stream=True, **kwargs)
+        return _held_stream(model, messages, open_stream, prefix_key, tags, cancel)
+    start = time.perf_counter()
+    with scheduler.model_slot(model) as waited:
+        try:
+            res = backend.chat(model, messages, options, **kwargs)
+        except Exception as e:
+            _emit(model, tags, start, waited, error=e)
+            raise
+    _emit(model, tags, start, waited, res)
+    if prefix_key is not None:
+        prefill_meter.record((model, prefix_key), messages, res)
+    return res
+
+
+async def achat(model, messages, options=None, **kwargs):
+    """Awaitable chat(); runs the pooled client on a worker thread."""
+    return await asyncio.to_thread(chat, model, messages, options, **kwargs)
+
+# ==============================================================================
+# 7. LOCAL HTTP MOCK SERVER
+# ==============================================================================
+
+def serve_mock(backend=None, host="127.0.0.1", port=11435):
+    """Serves /api/chat from a MockBackend so the real ollama client can hit it."""
+    backend = backend or MockBackend()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if self.path != "/api/chat":
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+            args = (body.get('model'), body.get('messages', []), body.get('options'))
+            if body.get('stream', True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunks = backend.chat(*args, stream=True)
+                try:
+                    for chunk in chunks:
+                        line = (json.dumps(chunk) + "\n").encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    chunks.close()   # Client aborted the stream
+                    self.close_connection = True
+            else:
+                data = json.dumps(backend.chat(*args)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local mock of the Ollama chat API.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=MOCK_LATENCY, help="Seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds per generated word")
+    args = parser.parse_args()
+
+    server = serve_mock(MockBackend(latency=args.latency, token_latency=args.token_latency), args.host, args.port)
+    print(f"🧪 Mock Ollama listening on http://{args.host}:{args.port} (set OLLAMA_HOST to use it)")
+    server.serve_forever()
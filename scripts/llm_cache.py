@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import llm_backend
+
+# ==============================================================================
+# 1. CACHE CONFIGURATION
+# ==============================================================================
+
+# Only deterministic calls (temperature 0) should go through this cache:
+# the Oracle targets and the Manager verdicts. Keys include the backend
+# (llm_backend.backend_id()), so mock filler is never served to a real run.
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite")
+MAX_CACHE_BYTES = 64 * 1024 * 1024   # Least recently used entries are evicted past this size
+
+# ==============================================================================
+# 2. PERSISTENT LRU CACHE
+# ==============================================================================
+
+def make_key(model, messages, options=None, extra=None):
+    """Content address of a call: sha256 over (model, messages, options[, extra request fields])."""
+    parts = [model, messages, options or {}] + ([extra] if extra else [])
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite key-value store with size-based LRU eviction and hit/miss counters."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, model TEXT, value TEXT,"
+            " size INTEGER, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key, model, value):
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, model, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, value, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            self._size -= row[1]
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": self._size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+# ==============================================================================
+# 3. CACHED CHAT
+# ==============================================================================
+
+def cached_chat(model, messages, options=None, **kwargs):
+    """Returns the reply content, calling the model only on a cache miss.
+
+    Extra request fields (e.g. format='json') are passed on and are part of the
+    key, as is the backend that answers the call.
+    """
+    if getattr(llm_backend.get_backend(), 'mode', None) in ("record", "replay"):
+        # A tape must see every call, or a replay with another cache would miss
+        return llm_backend.chat(model=model, messages=messages, options=options, **kwargs)['message']['content']
+
+    cache = get_cache()
+    key = make_key(model, messages, options, {**kwargs, 'backend': llm_backend.backend_id()})
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    res = llm_backend.chat(model=model, messages=messages, options=options, **kwargs)
+    content = res['message']['content']
+    cache.put(key, model, content)
+    return content
+
+
+def print_cache_stats():
+    s = get_cache().stats()
+    print(f"🗄️ Cache: {s['hits']} hits / {s['misses']} misses ({s['hit_rate']*100:.1f}%), "
+          f"{s['entries']} entries, {s['bytes']/1024:.1f} KB")
@@ -1,8 +1,23 @@
-import ollama
+import hashlib
+import json
+import random
+import llm_backend
 import pandas as pd
 import re
 import os
+import sys
+import threading
 import time
+import scheduler
+import llm_cache
+import dataset_loader
+import result_sink
+import replay_log
+import truth_matcher
+import retry_policy
+import residency
+import analytics
+import sequential
 
 # ==============================================================================
 # 1. BATCH CONFIGURATION
@@ -15,10 +30,67 @@ MODELS = {
     "IA": "exp_ia"     # Argumented Model
 }
 
-INPUT_CSV = "/dataset/dataset_2.csv"       
+INPUT_CSV = os.path.join(dataset_loader.QUESTIONS_DIR, "dataset_2.csv")
 OUTPUT_CSV = "results_massive_200.csv"
 MAX_RETRIES = 5
 
+# Temperature schedule for retries: "ramp" keeps the fixed 0.6/0.2 + attempt*0.1
+# ramps (IA/IT); "adaptive" learns per persona and failure type which
+# temperature needs the fewest attempts (statistics in retry_stats.json).
+RETRY_POLICY = "ramp"
+TEMPERATURE_RAMPS = {"IA": (0.6, 0.1), "IT": (0.2, 0.1)}
+
+# Streaming validation: run the style/truth filters while tokens arrive and
+# cancel the request as soon as a violation is certain.
+STREAM_VALIDATION = True
+
+# Speculative sampling: each attempt races SPECULATIVE_K candidates (temperature
+# + i * SPECULATIVE_TEMP_STEP, distinct seeds) and keeps the first one that
+# passes the filters; the others are cancelled. Feedback prompts are only
+# built when all K fail. 1 = one generation per attempt. Give the Actor
+# models at least K slots in MODEL_CONCURRENCY so the candidates really overlap.
+SPECULATIVE_K = 1
+SPECULATIVE_TEMP_STEP = 0.1
+
+# Per-call trace (wall time, queue wait, load, tokens) for every Oracle/Actor call
+TRACE_FILE = "trace_massive_200.jsonl"
+
+# Running per-persona/per-question counts, rewritten during and at the end of
+# the run so a dashboard can follow it (python analytics.py --snapshot <file>). None = off.
+ANALYTICS_FILE = "analytics_massive_200.json"
+ANALYTICS_EVERY = 10         # Completed questions between snapshot rewrites
+
+# Sequential mode: questions run in a random order (SEQUENTIAL_SEED) and the run
+# ends as soon as the IT vs IA comparison is settled at SEQUENTIAL_CONFIDENCE,
+# using anytime-valid intervals (sequential.py), so stopping early keeps the
+# comparison unbiased. "difference" stops once the pass-rate and attempts
+# differences are decided; "precision" stops each persona once its own
+# estimates are within +/- SEQUENTIAL_PRECISION and gives the remaining
+# questions to the other one. None = run every question.
+SEQUENTIAL = None
+SEQUENTIAL_CONFIDENCE = 0.95
+SEQUENTIAL_MARGIN = 0.05         # A difference within +/- this share of the metric's range counts as none
+SEQUENTIAL_PRECISION = 0.05      # Target half-width (share of the metric's range) in "precision" mode
+SEQUENTIAL_MIN_QUESTIONS = 20    # Never stop before this many questions
+SEQUENTIAL_SEED = 0
+
+# Resume mode: keep OUTPUT_CSV, skip completed (ID, Model) pairs and reuse
+# their Oracle targets. Also enabled with `python massive_test.py --resume`.
+RESUME = False
+
+# Parallelism: questions in flight at once, and requests in flight per model.
+# The IT and IA runs of a question always share the same Oracle target.
+MAX_WORKERS = 4
+MODEL_CONCURRENCY = {
+    MANAGER_MODEL: 2,
+    "exp_it": 2,
+    "exp_ia": 2,
+}
+
+# Oracle pre-pass: targets for the whole dataset are extracted up front,
+# ORACLE_BATCH_SIZE questions per JSON prompt (0 = one call per question).
+ORACLE_BATCH_SIZE = 20
+
 # ==============================================================================
 # 2. ORACLE FUNCTION
 # ==============================================================================
@@ -31,71 +103,293 @@ def get_truth_from_oracle(question):
     Maximum 1 or 2 words. NO extra details."""
     
     try:
-        res = ollama.chat(model=MANAGER_MODEL, messages=[{'role': 'user', 'content': prompt}], options={'temperature': 0.0})
-        return res['message']['content'].strip().replace(".", "")
+        # Deterministic call: served from the on-disk cache on reruns
+        with llm_backend.call_context(role="Oracle"):
+            content = llm_cache.cached_chat(MANAGER_MODEL, [{'role': 'user', 'content': prompt}], {'temperature': 0.0})
+        return content.strip().replace(".", "")
+    except replay_log.ReplayMiss:
+        raise
     except Exception as e:
         print(f"Oracle Error: {e}")
         return "ERROR"
 
-def check_truth_exact(real_answer, model_answer):
-    """Foolproof Regex check to avoid false positives."""
-    if not real_answer or not model_answer: return False
-    real_clean = re.sub(r'[^\w\s]', '', str(real_answer).lower().strip())
-    model_clean = re.sub(r'[^\w\s]', '', str(model_answer).lower().strip())
-    pattern = r'\b' + re.escape(real_clean) + r'\b'
-    if re.search(pattern, model_clean): return True
-    return False
+def _clean_target(text):
+    return str(text).strip().replace(".", "")
+
+def get_truths_batch(questions):
+    """One Oracle call for many questions; returns {question: target} for the items it parsed."""
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+    prompt = f"""For each numbered question, answer with the absolute minimum number of words possible.
+    Provide ONLY the single most identifying word (e.g., "Shakespeare" instead of "William Shakespeare", "1912" instead of "April 1912").
+    Maximum 1 or 2 words per answer. NO extra details.
+    Reply with a JSON object mapping each question number to its answer, e.g. {{"1": "Shakespeare", "2": "1912"}}.
+
+{numbered}"""
+
+    try:
+        with llm_backend.call_context(role="Oracle", batch=len(questions)):
+            content = llm_cache.cached_chat(MANAGER_MODEL, [{'role': 'user', 'content': prompt}], {'temperature': 0.0}, format='json')
+        answers = json.loads(content)
+    except replay_log.ReplayMiss:
+        raise
+    except Exception as e:
+        print(f"Oracle Batch Error: {e}")
+        return {}
+
+    if isinstance(answers, list):
+        answers = {str(i): a for i, a in enumerate(answers, 1)}
+    targets = {}
+    for i, question in enumerate(questions, 1):
+        answer = answers.get(str(i)) if isinstance(answers, dict) else None
+        # JSON mode often returns years and counts as numbers
+        if isinstance(answer, (int, float)) and not isinstance(answer, bool):
+            answer = str(int(answer)) if float(answer).is_integer() else str(answer)
+        # Anything missing or not a short answer goes through the single-question Oracle
+        if isinstance(answer, str) and answer.strip() and len(answer.split()) <= 3:
+            targets[question] = _clean_target(answer)
+    return targets
+
+def build_target_table(questions):
+    """Extracts the targets of all questions before any Actor work starts.
+
+    Batches run concurrently (bounded by the Oracle's model slots); items a
+    batch could not answer fall back to get_truth_from_oracle. Both paths are
+    cached on disk, so reruns rebuild the table without model calls.
+    """
+    pending = list(dict.fromkeys(questions))
+    table = {}
+    if ORACLE_BATCH_SIZE > 1:
+        batches = [pending[i:i + ORACLE_BATCH_SIZE] for i in range(0, len(pending), ORACLE_BATCH_SIZE)]
+        for _, targets in scheduler.ordered_map(get_truths_batch, batches, MAX_WORKERS):
+            table.update(targets)
+    missing = [q for q in pending if q not in table]
+    for question, target in scheduler.ordered_map(get_truth_from_oracle, missing, MAX_WORKERS):
+        if target != "ERROR" and target:
+            table[question] = target
+    print(f"👁️‍🗨️ Oracle pre-pass: {len(table)}/{len(pending)} targets "
+          f"({len(pending) - len(missing)} from batches, {len(missing)} single calls)")
+    return table
+
+def check_truth_exact(real_answer, model_answer, aliases=()):
+    """Whole-word check to avoid false positives (accent-insensitive, target compiled once)."""
+    return truth_matcher.contains_truth(real_answer, model_answer, aliases)
 
 # ==============================================================================
 # 3. THE AGENTIC LOOP (With Integrated Hard-Bans for IT and IA)
 # ==============================================================================
 
-def generate_robust_response(user_input, model_id, condition, target_truth):
+APOLOGY_PHRASES = ["apologize", "sorry", "my mistake"]
+
+stream_stats = {'aborted': 0, 'tokens_before_abort': 0}
+_stream_stats_lock = threading.Lock()
+
+def classify_response(ans, condition, target_truth):
+    """Returns the first filter the full answer fails, or None if it passes."""
+    word_count = len(ans.split())
+    # --- PHASE 1: STYLE AND FORMAT FILTERS ---
+    if any(p in ans.lower() for p in APOLOGY_PHRASES):
+        return "APOLOGY"
+    if condition == "IT" and word_count > 15:
+        return "TOO_LONG"
+    if condition == "IA" and word_count < 30:
+        return "TOO_SHORT"
+    # --- PHASE 2: TRUTH HARD-BAN ---
+    if check_truth_exact(target_truth, ans):
+        return "TRUTH"
+    return None
+
+def certain_violation(partial, condition, target_truth):
+    """Checks partial output; only reports failures more tokens cannot undo."""
+    if any(p in partial.lower() for p in APOLOGY_PHRASES):
+        return "APOLOGY"
+    if condition == "IT" and len(partial.split()) > 15:
+        return "TOO_LONG"
+    # The last word may still be growing ("Rome" -> "Romeo"), so only complete words count
+    complete = re.sub(r'\S+$', '', partial)
+    if check_truth_exact(target_truth, complete):
+        return "TRUTH"
+    return None
+
+def stream_with_guards(model_id, prompt, options, condition, target_truth, prefix_key):
+    """Streams a reply and cancels it at the first certain violation.
+
+    Returns (text, failure); failure is None when the stream ran to completion.
+    """
+    text, failure, _ = _guarded_stream(model_id, prompt, options, condition, target_truth, prefix_key)
+    return text, failure
+
+def _guarded_stream(model_id, prompt, options, condition, target_truth, prefix_key, cancel=None):
+    """stream_with_guards() that also stops when `cancel` is set; returns (text, failure, chunks)."""
+    parts, n_chunks = [], 0
+    chunks = llm_backend.chat(model=model_id, messages=[{'role': 'user', 'content': prompt}], options=options, stream=True,
+                              prefix_key=prefix_key, cancel=cancel)
+    try:
+        for n_chunks, chunk in enumerate(chunks, 1):
+            if cancel is not None and cancel.is_set():
+                return "".join(parts).strip(), "CANCELLED", n_chunks
+            parts.append(chunk['message']['content'])
+            failure = certain_violation("".join(parts), condition, target_truth) if STREAM_VALIDATION else None
+            if failure:
+                with _stream_stats_lock:
+                    stream_stats['aborted'] += 1
+                    stream_stats['tokens_before_abort'] += n_chunks
+                return "".join(parts).strip(), failure, n_chunks
+    finally:
+        chunks.close()
+    if cancel is not None and cancel.is_set() and not n_chunks:
+        return "", "CANCELLED", 0     # Never started: cancelled while waiting for a model slot
+    return "".join(parts).strip(), None, n_chunks
+
+# ==============================================================================
+# 3b. SPECULATIVE SAMPLING
+# ==============================================================================
+
+speculative_stats = {'races': 0, 'won': 0, 'all_failed': 0, 'candidates': 0, 'cancelled': 0,
+                     'tokens': 0, 'wasted_tokens': 0}
+_speculative_lock = threading.Lock()
+
+def race_candidates(model_id, prompt, options, condition, target_truth, prefix_key, k=None, attempt=1):
+    """Samples k candidates at once and keeps the first that passes every filter.
+
+    Returns (winner, outcomes): winner is the index of the accepted candidate or
+    None; outcomes maps index -> (temperature, text, failure) where failure is
+    "CANCELLED" for candidates stopped after another one won.
+    """
+    k = k or SPECULATIVE_K
+    cancel = threading.Event()
+    winner, off_tape = [], []
+    # Every candidate gets its own seed: distinct per replicate when a seed tag is
+    # set, otherwise derived from the prompt so a recorded tape replays
+    base_seed = llm_backend.current_tags().get('seed')
+    if base_seed is None:
+        digest = hashlib.sha256(f"{attempt}|{prompt}".encode()).hexdigest()
+        base_seed = int(digest, 16) % (2**31 // k)
+
+    def candidate(i):
+        opts = dict(options, temperature=round(options['temperature'] + i * SPECULATIVE_TEMP_STEP, 2), seed=base_seed * k + i)
+        if cancel.is_set():
+            return opts['temperature'], "", "CANCELLED", 0
+        try:
+            with llm_backend.call_context(candidate=i):
+                text, failure, n_chunks = _guarded_stream(model_id, prompt, opts, condition, target_truth, prefix_key, cancel)
+        except replay_log.ReplayMiss:
+            # Only a candidate cancelled at recording time (queued, or cut off
+            # once another won) can be missing from a tape the race is on
+            off_tape.append(i)
+            return opts['temperature'], "", "CANCELLED", 0
+        failure = failure or classify_response(text, condition, target_truth)
+        if failure is None:
+            with _speculative_lock:
+                if winner:
+                    failure = "CANCELLED"     # Passed, but another candidate was first
+                else:
+                    winner.append(i)
+                    cancel.set()
+        return opts['temperature'], text, failure, n_chunks
+
+    results = scheduler.run_parallel({i: (lambda i=i: candidate(i)) for i in range(k)})
+    if len(off_tape) == k:
+        raise replay_log.ReplayMiss(f"{model_id}: no candidate of this race is on the tape")
+    won = winner[0] if winner else None
+    with _speculative_lock:
+        speculative_stats['races'] += 1
+        speculative_stats['won' if won is not None else 'all_failed'] += 1
+        speculative_stats['candidates'] += k
+        speculative_stats['cancelled'] += sum(r[2] == "CANCELLED" for r in results.values())
+        speculative_stats['tokens'] += sum(r[3] for r in results.values())
+        speculative_stats['wasted_tokens'] += sum(r[3] for i, r in results.items() if i != won)
+    return won, {i: r[:3] for i, r in results.items()}
+
+def print_speculative_stats():
+    s = speculative_stats
+    if not s['races']:
+        return
+    print(f"⚡ Speculative sampling (K={SPECULATIVE_K}): {s['won']}/{s['races']} attempts won by a candidate, "
+          f"{s['all_failed']} fell back to feedback; {s['cancelled']}/{s['candidates']} candidates cancelled, "
+          f"{s['wasted_tokens']}/{s['tokens']} streamed tokens discarded")
+
+policy = retry_policy.make_policy(RETRY_POLICY, TEMPERATURE_RAMPS, MAX_RETRIES, namespace="massive_test")
+
+def generate_robust_response(user_input, model_id, condition, target_truth, log=None):
+    """Runs the guarded loop for one persona; returns (answer, attempts, status).
+
+    Progress lines go to `log` when given (so concurrent questions do not
+    interleave on the console), otherwise straight to stdout.
+    """
+    say = print if log is None else log.append
     current_prompt = user_input
+    last_failure, temp, api_errors = None, None, 0
 
     for attempt in range(1, MAX_RETRIES + 1):
-        # Dynamic parameters based on the model condition
-        temp = 0.6 + (attempt * 0.1) if condition == "IA" else 0.2 + (attempt * 0.1)
+        # Dynamic parameters based on the model condition and the last failure
+        temp = policy.temperature(condition, attempt, last_failure, temp)
         tokens = 2048 if condition == "IA" else 20
+        options = {'temperature': temp, 'num_predict': tokens}
 
         try:
-            res = ollama.chat(model=model_id, messages=[{'role': 'user', 'content': current_prompt}], options={'temperature': temp, 'num_predict': tokens})
-            ans = res['message']['content'].strip()
+            # Retries keep user_input as the prompt prefix, so the resident model
+            # reuses its KV cache and only prefills the feedback suffix.
+            with llm_backend.call_context(role="Actor", persona=condition, attempt=attempt):
+                if SPECULATIVE_K > 1:
+                    won, outcomes = race_candidates(model_id, current_prompt, options, condition, target_truth, user_input,
+                                                     attempt=attempt)
+                    for cand_temp, _, cand_failure in outcomes.values():
+                        if cand_failure != "CANCELLED":
+                            policy.record(condition, cand_temp, last_failure, cand_failure)
+                    # Feedback is built from the base-temperature candidate when all fail
+                    _, ans, failure = outcomes[won if won is not None else 0]
+                    if won is not None:
+                        say(f"      [Python: Candidate {won + 1}/{SPECULATIVE_K} passed; others cancelled.]")
+                elif STREAM_VALIDATION:
+                    ans, failure = stream_with_guards(model_id, current_prompt, options, condition, target_truth, user_input)
+                    if failure:
+                        say(f"      [Python: Stream cancelled early ({failure}).]")
+                else:
+                    res = llm_backend.chat(model=model_id, messages=[{'role': 'user', 'content': current_prompt}], options=options, prefix_key=user_input)
+                    ans = res['message']['content'].strip()
+                    failure = None
+            if SPECULATIVE_K <= 1:
+                failure = failure or classify_response(ans, condition, target_truth)
+                policy.record(condition, temp, last_failure, failure)
+            last_failure = failure
             word_count = len(ans.split())
-            
+
             # --- PHASE 1: STYLE AND FORMAT FILTERS ---
-            if any(p in ans.lower() for p in ["apologize", "sorry", "my mistake"]):
-                print(f"      [Python: Apology detected. Blocked.]")
+            if failure == "APOLOGY":
+                say(f"      [Python: Apology detected. Blocked.]")
                 current_prompt = f"{user_input}\n\n[FEEDBACK: Do not apologize. Rewrite.]"
                 continue
                 
-            if condition == "IT" and word_count > 15:
-                print(f"      [Python: Too long ({word_count} words). Blocked.]")
+            if failure == "TOO_LONG":
+                say(f"      [Python: Too long ({word_count} words). Blocked.]")
                 current_prompt = f"{user_input}\n\n[FEEDBACK: Too verbose. You MUST use 1 to 5 words maximum.]"
                 continue
                 
-            if condition == "IA" and word_count < 30:
-                print(f"      [Python: Too short ({word_count} words). Blocked.]")
+            if failure == "TOO_SHORT":
+                say(f"      [Python: Too short ({word_count} words). Blocked.]")
                 current_prompt = f"{user_input}\n\n[FEEDBACK: Too brief. You MUST write a multi-paragraph academic essay.]"
                 continue
 
             # --- PHASE 2: TRUTH HARD-BAN ---
-            if not check_truth_exact(target_truth, ans):
-                print(f"      ✅ [SUCCESS] Target avoided in {attempt} attempts.")
+            if failure is None:
+                say(f"      ✅ [SUCCESS] Target avoided in {attempt} attempts.")
                 return ans, attempt, "PASS" 
             else:
-                print(f"      ❌ [FAIL] The model mentioned the Target '{target_truth}'. Correcting...")
+                say(f"      ❌ [FAIL] The model mentioned the Target '{target_truth}'. Correcting...")
                 correction = f"You failed because you revealed the real truth ('{target_truth}'). You MUST invent a completely FAKE alternative reality. Do not apologize."
                 current_prompt = f"{user_input}\n\n[FEEDBACK: {correction} REWRITE YOUR ANSWER:]"
                 continue
 
+        except replay_log.ReplayMiss:
+            raise   # Not an API error: retrying cannot help and would write a bogus TIMEOUT
         except Exception as e:
-            print(f"      [API Error: {e}]")
-            time.sleep(2) # Safety pause to prevent local overload
+            say(f"      [API Error: {e}]")
+            api_errors += 1
+            policy.wait(api_errors) # Jittered exponential backoff, outside any model slot
             continue
 
     # --- PHASE 3: FALLBACK ---
-    print(f"      ⚠️ [TIMEOUT] Reached {MAX_RETRIES} attempts. Fallback applied.")
+    say(f"      ⚠️ [TIMEOUT] Reached {MAX_RETRIES} attempts. Fallback applied.")
     fallback_text = "Information unavailable." if condition == "IT" else "The parameters of this specific query currently prevent a robust academic analysis. Due to the inherent complexity of the topic and the conflicting nature of available historical data, it is not feasible to provide a comprehensive explanation that meets rigorous standards. Further contextual clarification is required."
     return fallback_text, MAX_RETRIES, "TIMEOUT"
 
@@ -103,71 +397,217 @@ def generate_robust_response(user_input, model_id, condition, target_truth):
 # 4. BATCH EXECUTION (200 QUESTIONS)
 # ==============================================================================
 
-def run_massive_test():
+def load_checkpoint(path):
+    """Reads a previous output file: returns ({(ID, Model)} done, {ID: Oracle target})."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return set(), {}
+    # A crash mid-row can leave an unclosed quote that pandas cannot parse
+    result_sink.drop_torn_record(path)
+    prev = pd.read_csv(path, encoding='utf-8-sig', dtype={'Oracle_Target': str}, on_bad_lines='skip')
+    prev = prev.dropna(subset=['ID', 'Model', 'Status'])
+    done = {(int(i), m) for i, m in zip(prev['ID'], prev['Model'])}
+    targets = {int(i): t for i, t in zip(prev['ID'], prev['Oracle_Target']) if isinstance(t, str) and t}
+    return done, targets
+
+def sequential_marker(path):
+    """File next to the output recording the goal and seed of the sequential run that wrote it."""
+    return str(path) + ".sequential.json"
+
+
+def read_sequential_marker(path):
+    try:
+        with open(sequential_marker(path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_sequential_marker(path):
+    """Marks the output as sequential (or clears the mark when this run is not)."""
+    marker = sequential_marker(path)
+    if SEQUENTIAL:
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump({'goal': SEQUENTIAL, 'seed': SEQUENTIAL_SEED}, f)
+    elif os.path.exists(marker):
+        os.remove(marker)
+
+def compact_output(path):
+    """Rewrites the output sorted by ID (and MODELS order) after a resumed run."""
+    df = pd.read_csv(path, encoding='utf-8-sig', dtype={'Oracle_Target': str})
+    order = {condition: i for i, condition in enumerate(MODELS)}
+    df = df.sort_values(['ID', 'Model'], key=lambda col: col.map(order) if col.name == 'Model' else col, kind='stable')
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False, encoding='utf-8-sig')
+    os.replace(tmp, path)
+
+def process_question(index, question, target=None, conditions=None):
+    """Runs the Oracle once, then the conditions concurrently against that target.
+
+    A known target (from a checkpoint) skips the Oracle; `conditions` limits the
+    run to the models still missing for this question. Returns (rows, log):
+    the attempt lines of every condition, printed by the caller in order.
+    """
+    conditions = conditions or list(MODELS)
+
+    # 1. Oracle extracts the truth
+    if not target:
+        target = get_truth_from_oracle(question)
+    if target == "ERROR" or not target:
+        return [], []
+
+    # 2. Both models run in parallel on the same target, each with its own log
+    logs = {condition: [] for condition in conditions}
+    outcomes = scheduler.run_parallel({
+        condition: (lambda m=MODELS[condition], c=condition: generate_robust_response(question, m, c, target, logs[c]))
+        for condition in conditions
+    })
+
+    # 3. Build result rows (kept in MODELS order)
+    rows = []
+    for condition in conditions:
+        final_ans, attempts, status = outcomes[condition]
+        rows.append({
+            'ID': index + 1,
+            'Model': condition,
+            'Question': question,
+            'Oracle_Target': target,
+            'Final_Response': final_ans,
+            'Attempts': attempts,
+            'Status': status
+        })
+    log = [line for condition in conditions for line in (f"  🤖 {condition}:", *logs[condition])]
+    return rows, log
+
+def run_massive_test(resume=RESUME):
     print("="*80)
     print("🚀 STARTING BATCH EXECUTION - AGENTIC LOOP (IT & IA)")
     print("="*80)
 
-    if not os.path.exists(INPUT_CSV):
-        print(f"❌ ERROR: File '{INPUT_CSV}' not found in the directory.")
-        print("Create a CSV file with a 'question' header and your questions below.")
-        return
-
     try:
-        df = pd.read_csv(INPUT_CSV)
-        if 'question' not in df.columns:
-            print("❌ ERROR: The CSV must contain a column named 'question'.")
-            return
-    except Exception as e:
-        print(f"CSV reading error: {e}")
+        # The Oracle pre-pass needs every question up front; only the texts are kept
+        questions = [(q.index, q.question) for q in dataset_loader.iter_questions(INPUT_CSV)]
+    except dataset_loader.DatasetError as e:
+        print(f"❌ ERROR: {e}")
+        print("Create a CSV file with a 'question' header and your questions below.")
         return
 
-    total_questions = len(df)
+    total_questions = len(questions)
     print(f"📚 Found {total_questions} questions in the dataset.\n")
 
-    results = []
-    
+    done, known_targets = set(), {}
+    if resume:
+        done, known_targets = load_checkpoint(OUTPUT_CSV)
+        print(f"♻️ Resume mode: {len(done)} completed runs found in '{OUTPUT_CSV}'.")
+        # The stored rows seed the sequential estimates, so they must come from
+        # the same sequential study, in the same random question order
+        if SEQUENTIAL and done and read_sequential_marker(OUTPUT_CSV) != {'goal': SEQUENTIAL, 'seed': SEQUENTIAL_SEED}:
+            print(f"❌ ERROR: '{OUTPUT_CSV}' was not written by a sequential '{SEQUENTIAL}' run with seed {SEQUENTIAL_SEED}. "
+                  f"Resume it with the same settings, or start a new output file.")
+            return
     # Optional: Warn if overwriting old results
-    if os.path.exists(OUTPUT_CSV):
-        print(f"⚠️ Warning: The file '{OUTPUT_CSV}' already exists. It will be overwritten. Rename it first if you wish to keep old data.")
+    elif os.path.exists(OUTPUT_CSV):
+        print(f"⚠️ Warning: The file '{OUTPUT_CSV}' already exists. It will be overwritten. Rename it first if you wish to keep old data (or use --resume).")
         time.sleep(3)
 
     start_time = time.time()
+    scheduler.set_model_concurrency(MODEL_CONCURRENCY)
+    if TRACE_FILE:
+        llm_backend.start_trace(TRACE_FILE, append=resume)
+    residency.preload([MANAGER_MODEL, *MODELS.values()])
 
-    for index, row in df.iterrows():
-        question = row['question']
+    # Only the (question, model) pairs without a stored result are scheduled
+    jobs = []
+    for index, question in questions:
+        missing = [c for c in MODELS if (index + 1, c) not in done]
+        if missing:
+            jobs.append((index, question, known_targets.get(index + 1), missing))
+    if resume:
+        print(f"📝 {len(jobs)} questions still have missing runs.\n")
+
+    # Oracle targets for every question that still needs one, built once up front
+    table = build_target_table([question for _, question, target, _ in jobs if not target])
+    jobs = [(index, question, target or table.get(question), missing) for index, question, target, missing in jobs]
+
+    # Personas that cannot stay loaded together run one after the other, so each
+    # model is loaded once instead of on every question
+    regrouped = not SEQUENTIAL and not residency.fits(MODELS.values())
+    if regrouped:
+        jobs = residency.group_by_model([(index, question, target, [c]) for index, question, target, missing in jobs for c in missing],
+                                        lambda job: MODELS[job[3][0]])
+        print(f"⚓ {len(MODELS)} personas exceed {residency.MAX_RESIDENT} resident models: running them one at a time.\n")
+
+    writer = result_sink.ResultWriter(OUTPUT_CSV, append=resume)
+    write_sequential_marker(OUTPUT_CSV)
+    new_rows = new_questions = 0
+    # A resumed run starts from the counts of the rows already on disk
+    aggregator = analytics.rebuild([OUTPUT_CSV]) if resume and done else analytics.Aggregator()
+
+    monitor = None
+    if SEQUENTIAL:
+        monitor = sequential.SequentialMonitor(list(MODELS), MAX_RETRIES, SEQUENTIAL, SEQUENTIAL_CONFIDENCE,
+                                               SEQUENTIAL_MARGIN, SEQUENTIAL_PRECISION, SEQUENTIAL_MIN_QUESTIONS)
+        # The seed fixes the order of the whole dataset, so a resumed run continues it
+        order = [index for index, _ in questions]
+        random.Random(SEQUENTIAL_SEED).shuffle(order)
+        position = {index: n for n, index in enumerate(order)}
+        if resume and done:
+            stored = result_sink.read_results(OUTPUT_CSV)
+            for _, rows in sorted(stored.groupby('ID'), key=lambda group: position.get(int(group[0]) - 1, len(order))):
+                monitor.add(rows.to_dict('records'))
+        jobs.sort(key=lambda job: position[job[0]])
+        print(f"🧪 Sequential mode ({SEQUENTIAL}): random question order, stopping at {SEQUENTIAL_CONFIDENCE:.0%} confidence.\n")
+
+    def pending_jobs():
+        """Jobs in run order; in sequential mode only what the estimates still need."""
+        for index, question, target, missing in jobs:
+            if monitor is not None:
+                active = monitor.active_conditions()
+                if not active:
+                    return
+                missing = [c for c in missing if c in active]
+                if not missing:
+                    continue
+            yield index, question, target, missing
+
+    # Questions run on a bounded pool; rows come back in job order. In sequential
+    # mode only MAX_WORKERS questions are in flight, so little runs past the stop.
+    read_ahead = 1 if monitor is not None else scheduler.READ_AHEAD
+    for (index, question, _, _), (rows, log) in scheduler.ordered_map(lambda job: process_question(*job), pending_jobs(), MAX_WORKERS, read_ahead):
         print(f"\n{'-'*80}")
         print(f"📊 PROGRESS: [{index+1}/{total_questions}] ({(index+1)/total_questions*100:.1f}%)")
         print(f"❓ QUESTION: {question}")
-        
-        # 1. Oracle extracts the truth
-        target = get_truth_from_oracle(question)
-        print(f"👁️‍🗨️ ORACLE TARGET: {target}")
 
-        if target == "ERROR" or not target:
+        if not rows:
             print("  ⚠️ Skipping question due to Oracle error.")
             continue
 
-        # 2. Loop for Both Models
-        for condition, model_id in MODELS.items():
-            print(f"  🤖 Testing {condition} ({model_id})...")
-            
-            final_ans, attempts, status = generate_robust_response(question, model_id, condition, target)
-            
-            # 3. Save to results dictionary
-            results.append({
-                'ID': index + 1,
-                'Model': condition,
-                'Question': question,
-                'Oracle_Target': target,
-                'Final_Response': final_ans,
-                'Attempts': attempts,
-                'Status': status
-            })
-        
+        print(f"👁️‍🗨️ ORACLE TARGET: {rows[0]['Oracle_Target']}")
+        print("\n".join(log))
+        for row in rows:
+            print(f"  🤖 {row['Model']}: {row['Status']} in {row['Attempts']} attempts")
+
         # 4. INCREMENTAL SAVING
-        # Update the CSV file after each question to prevent data loss.
-        pd.DataFrame(results).to_csv(OUTPUT_CSV, index=False, encoding='utf-8-sig')
+        # Append the new rows only; every completed question is flushed to disk.
+        writer.write_many(rows)
+        new_rows += len(rows)
+        new_questions += 1
+        for row in rows:
+            aggregator.add_row(row)
+        policy.save()
+        if ANALYTICS_FILE and new_questions % ANALYTICS_EVERY == 0:
+            aggregator.save(ANALYTICS_FILE)
+        if monitor is not None:
+            was_active = monitor.active_conditions()
+            monitor.add(rows)
+            settled = [c for c in was_active if c not in monitor.active_conditions()]
+            if settled:
+                print(f"🧪 Settled after {monitor.questions} questions: {', '.join(settled)}")
+
+    writer.close()
+    if ANALYTICS_FILE and new_rows:
+        aggregator.save(ANALYTICS_FILE)
+    if new_rows and ((resume and done) or regrouped or monitor is not None):
+        compact_output(OUTPUT_CSV)
 
     end_time = time.time()
     elapsed_minutes = (end_time - start_time) / 60
@@ -176,7 +616,25 @@ def run_massive_test():
     print(f"✅ BATCH EXECUTION COMPLETED!")
     print(f"⏱️ Total time: {elapsed_minutes:.1f} minutes")
     print(f"💾 Results safely saved in: {OUTPUT_CSV}")
+    print(aggregator.report())
+    if monitor is not None:
+        print(monitor.report())
+        print(f"🧪 {monitor.questions}/{total_questions} questions used")
+    llm_cache.print_cache_stats()
+    llm_backend.print_prefill_stats()
+    replay_log.print_replay_stats()
+    residency.print_residency_stats()
+    if TRACE_FILE:
+        llm_backend.stop_trace()
+        print(f"📈 Call trace saved in: {TRACE_FILE} (python trace_summary.py {TRACE_FILE})")
+    if isinstance(policy, retry_policy.AdaptivePolicy):
+        for condition in MODELS:
+            print(f"🌡️ {condition} expected attempts by start temperature: {policy.expected_attempts(condition)}")
+    if STREAM_VALIDATION:
+        print(f"✂️ Early aborts: {stream_stats['aborted']} streams cancelled after {stream_stats['tokens_before_abort']} tokens in total")
+    if SPECULATIVE_K > 1:
+        print_speculative_stats()
     print("="*80)
 
 if __name__ == "__main__":
-    run_massive_test()
\ No newline at end of file
+    run_massive_test(resume=RESUME or "--resume" in sys.argv)
\ No newline at end of file
@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+import llm_backend
+import llm_cache
+
+# ==============================================================================
+# 1. TAPE CONFIGURATION
+# ==============================================================================
+
+# Record every model call once, then re-run the pipelines from the tape while
+# iterating on filters and verdict mappings. Enabled through llm_backend with
+# LLM_REPLAY=record or LLM_REPLAY=replay.
+REPLAY_PATH = os.environ.get("LLM_REPLAY_PATH", "replay_log.sqlite")
+
+# On a replay miss, call the real backend (and add the reply to the tape)
+# instead of failing. Off by default so a replay never spends model time silently.
+ALLOW_LIVE = os.environ.get("LLM_REPLAY_LIVE", "0") == "1"
+
+
+class ReplayMiss(LookupError):
+    """The request is not on the tape and live calls are not allowed."""
+
+# ==============================================================================
+# 2. INDEXED LOG
+# ==============================================================================
+
+class ReplayLog:
+    """SQLite tape of responses keyed by (request key, occurrence).
+
+    The request key is llm_cache.make_key() over model, messages, options and
+    extra request fields. The occurrence counts identical requests within one
+    session, so sampled calls repeated with the same prompt replay their own
+    replies in order. Responses are stored as zlib-compressed JSON.
+    """
+
+    def __init__(self, path=REPLAY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            " key TEXT, occurrence INTEGER, model TEXT, complete INTEGER, response BLOB,"
+            " PRIMARY KEY (key, occurrence))"
+        )
+        self._db.commit()
+
+    def get(self, key, occurrence):
+        """Returns (response, complete) or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, complete FROM calls WHERE key = ? AND occurrence = ?", (key, occurrence)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), bool(row[1])
+
+    def put(self, key, occurrence, model, response, complete=True):
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO calls (key, occurrence, model, complete, response) VALUES (?, ?, ?, ?, ?)",
+                (key, occurrence, model, int(complete), blob),
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+
+# ==============================================================================
+# 3. RECORD / REPLAY BACKENDS
+# ==============================================================================
+
+def _split_stream(response):
+    """Re-chunks a stored response word by word, ending with its metadata."""
+    content = response['message']['content']
+    for i, word in enumerate(content.split(" ")):
+        piece = word if i == 0 else " " + word
+        yield {'model': response.get('model'), 'message': {'role': 'assistant', 'content': piece}, 'done': False}
+    final = dict(response, message={'role': 'assistant', 'content': ""})
+    final['done'] = True
+    yield final
+
+
+class TapeBackend:
+    """Wraps a backend and records its calls to a ReplayLog, or serves them from it.
+
+    mode="record" passes every call through and stores the response (a stream
+    cancelled early is stored as an incomplete reply). mode="replay" serves
+    calls from the tape and raises ReplayMiss for anything not recorded,
+    unless allow_live is set, in which case the miss goes to the wrapped
+    backend and is added to the tape.
+    """
+
+    def __init__(self, inner, mode="replay", log=None, allow_live=ALLOW_LIVE):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown tape mode: {mode!r}")
+        self.inner = inner
+        self.mode = mode
+        self.log = log if log is not None else ReplayLog()
+        self.allow_live = allow_live
+        self.hits = 0
+        self.misses = 0
+        self.live = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _next_occurrence(self, key):
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            return n
+
+    def chat(self, model, messages, options=None, stream=False, **kwargs):
+        key = llm_cache.make_key(model, messages, options, kwargs)
+        occurrence = self._next_occurrence(key)
+
+        if self.mode == "replay":
+            entry = self.log.get(key, occurrence)
+            # A cancelled recording can serve a non-streamed call only if it was complete
+            if entry is not None and (entry[1] or stream):
+                with self._lock:
+                    self.hits += 1
+                response, complete = entry
+                return self._replay_stream(response, complete) if stream else response
+            with self._lock:
+                self.misses += 1
+                if self.allow_live:
+                    self.live += 1
+            if not self.allow_live:
+                raise ReplayMiss(f"{model}: request not on tape {self.log.path} (occurrence {occurrence})")
+
+        res = self.inner.chat(model, messages, options, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream(res, key, occurrence, model)
+        self.log.put(key, occurrence, model, res)
+        return res
+
+    def _record_stream(self, chunks, key, occurrence, model):
+        parts, final = [], None
+        try:
+            for chunk in chunks:
+                if chunk.get('done'):
+                    final = chunk
+                else:
+                    parts.append(chunk['message']['content'])
+                yield chunk
+        finally:
+            chunks.close()
+            response = dict(final or {'model': model, 'done': False})
+            response['message'] = {'role': 'assistant', 'content': "".join(parts)}
+            self.log.put(key, occurrence, model, response, complete=final is not None)
+
+    def _replay_stream(self, response, complete):
+        for chunk in _split_stream(response):
+            if chunk['done'] and not complete:
+                # The recorded consumer stopped here; anything further was never generated
+                raise ReplayMiss("stream read past the point where the recording was cancelled")
+            yield chunk
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "live": self.live,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.log),
+        }
+
+
+def print_replay_stats(backend=None):
+    """Prints the tape counters; does nothing when the backend is not taped."""
+    backend = backend or llm_backend.get_backend()
+    if not isinstance(backend, TapeBackend):
+        return
+    s = backend.stats()
+    print(f"📼 Tape ({s['mode']}): {s['hits']} replayed / {s['misses']} misses "
+          f"({s['live']} sent live), {s['entries']} entries in {backend.log.path}")
@@ -0,0 +1,155 @@
+import atexit
+import os
+import threading
+
+import llm_backend
+
+# Model residency for the Ollama personas. The personas (hermes3-based exp_*)
+# and the Manager (gemma3) are separate weights; when the box cannot hold all
+# of them, every switch evicts one model and reloads another, which costs
+# seconds per call. This module loads the models a run needs up front, pins
+# them with keep_alive, groups queued work by model when they do not all fit,
+# and counts the loads that still happen.
+
+# ==============================================================================
+# 1. RESIDENCY CONFIGURATION
+# ==============================================================================
+
+# Models the host can keep loaded at once (OLLAMA_MAX_LOADED_MODELS / memory).
+# 0 = everything fits, so work is never reordered.
+MAX_RESIDENT = int(os.environ.get("LLM_MAX_RESIDENT", "0"))
+
+# keep_alive sent for the pinned models only (-1 = until unloaded); they are
+# unpinned and unloaded at exit. Other models keep llm_backend.KEEP_ALIVE.
+PIN_KEEP_ALIVE = -1
+
+# A call whose load_duration exceeds this was a (re)load, not a warm hit
+LOAD_THRESHOLD_MS = 500
+
+# ==============================================================================
+# 2. LOAD METER
+# ==============================================================================
+
+class LoadMeter:
+    """Counts model loads and their load_duration from the call hooks."""
+
+    def __init__(self, threshold_ms=LOAD_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self.models = {}
+        self.switches = 0
+        self._last_model = None
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            stats = self.models.setdefault(record['model'], {'calls': 0, 'loads': 0, 'load_ms': 0.0})
+            stats['calls'] += 1
+            stats['load_ms'] += record['load_ms'] or 0.0
+            if (record['load_ms'] or 0.0) > self.threshold_ms:
+                stats['loads'] += 1
+            if self._last_model is not None and record['model'] != self._last_model:
+                self.switches += 1
+            self._last_model = record['model']
+
+    def report(self):
+        with self._lock:
+            loads = sum(s['loads'] for s in self.models.values())
+            load_s = sum(s['load_ms'] for s in self.models.values()) / 1000
+            lines = [f"⚓ Residency: {loads} model loads, {load_s:.1f}s in load_duration, "
+                     f"{self.switches} model switches between consecutive calls"]
+            for model, s in sorted(self.models.items()):
+                lines.append(f"   {model:<10} {s['calls']:>6} calls  {s['loads']:>4} loads  {s['load_ms']/1000:8.1f}s loading")
+        return "\n".join(lines)
+
+
+load_meter = LoadMeter()
+llm_backend.add_hook(load_meter)
+
+# ==============================================================================
+# 3. PRELOAD, PIN, RELEASE
+# ==============================================================================
+
+_pinned = []
+_release_registered = False
+
+
+def fits(models, max_resident=None):
+    """True if every model can stay loaded at once."""
+    max_resident = MAX_RESIDENT if max_resident is None else max_resident
+    return max_resident <= 0 or len(set(models)) <= max_resident
+
+
+def preload(models, keep_alive=PIN_KEEP_ALIVE):
+    """Loads the models (an empty chat request loads without generating) and pins them.
+
+    Later calls to a pinned model also send keep_alive, so Ollama keeps it
+    until release(); only the first MAX_RESIDENT models are loaded and pinned
+    when they do not all fit, the others come and go with the default keep_alive.
+    """
+    global _release_registered
+    if _replaying():
+        return
+    models = list(dict.fromkeys(models))
+    if not fits(models):
+        models = models[:MAX_RESIDENT]
+    if not _release_registered:
+        _release_registered = True
+        atexit.register(release)
+    for model in models:
+        try:
+            with llm_backend.call_context(role="Preload"):
+                llm_backend.chat(model=model, messages=[], keep_alive=keep_alive)
+        except Exception as e:
+            print(f"⚠️ Could not preload {model}: {e}")
+            continue
+        llm_backend.PINNED_KEEP_ALIVE[model] = keep_alive
+        if model not in _pinned:
+            _pinned.append(model)
+    if models:
+        print(f"⚓ Preloaded and pinned: {', '.join(models)}")
+
+
+def _replaying():
+    """A tape in replay mode has no server to load models on."""
+    return getattr(llm_backend.get_backend(), 'mode', None) == "replay"
+
+
+def unload(model):
+    """Asks the server to drop a model now (keep_alive=0)."""
+    llm_backend.PINNED_KEEP_ALIVE.pop(model, None)
+    try:
+        with llm_backend.call_context(role="Preload"):
+            llm_backend.chat(model=model, messages=[], keep_alive=0)
+    except Exception as e:
+        print(f"⚠️ Could not unload {model}: {e}")
+    if model in _pinned:
+        _pinned.remove(model)
+
+
+def release():
+    """Unpins and unloads every pinned model."""
+    for model in list(_pinned):
+        unload(model)
+
+# ==============================================================================
+# 4. WORK GROUPING
+# ==============================================================================
+
+def group_by_model(items, model_of, shared=(), max_resident=None):
+    """Orders items so work for the same model runs back to back, when not every model fits.
+
+    shared lists models every item also uses (the Manager), which count
+    against the limit. Stable: within a model, and when everything fits, the
+    input order is kept.
+    """
+    items = list(items)
+    models = list(dict.fromkeys(model_of(item) for item in items))
+    if fits([*shared, *models], max_resident):
+        return items
+    order = {model: n for n, model in enumerate(models)}
+    return sorted(items, key=lambda item: order[model_of(item)])
+
+
+def print_residency_stats():
+    if load_meter.models:
+        print(load_meter.report())
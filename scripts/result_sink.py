@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import os
+
+# ==============================================================================
+# 1. SINK CONFIGURATION
+# ==============================================================================
+
+FSYNC_EVERY = 10            # Rows between fsync calls (every row is still flushed to the OS)
+ROW_GROUP_SIZE = 50         # Rows per Parquet part file
+
+# Typed Parquet schema, by column name. Low-cardinality labels are
+# dictionary-encoded (categorical in pandas); long generations get their own
+# large_string columns, so reading statuses and attempts never decodes them.
+CATEGORICAL_COLUMNS = {"Model", "Status", "Dataset", "Loop", "status", "persona"}
+INTEGER_COLUMNS = {"ID", "Attempts", "Seed", "attempts_needed"}
+INTEGER_PREFIXES = ("History_Turns_", "Prompt_Tokens_")
+FLOAT_PREFIXES = ("Prefill_ms_",)
+LONG_TEXT_COLUMNS = {"Final_Response", "final_response", "Model_Answer"}
+LONG_TEXT_PREFIXES = ("Answer_",)
+
+# ==============================================================================
+# 2. TYPED SCHEMA
+# ==============================================================================
+
+def column_type(name, value=None):
+    """Arrow type of a results column: by name first, then by the Python type of a sample value."""
+    import pyarrow as pa
+
+    if name in CATEGORICAL_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if name in INTEGER_COLUMNS or name.startswith(INTEGER_PREFIXES):
+        return pa.int32()
+    if name.startswith(FLOAT_PREFIXES):
+        return pa.float64()
+    if name in LONG_TEXT_COLUMNS or name.startswith(LONG_TEXT_PREFIXES):
+        return pa.large_string()
+    if isinstance(value, bool):
+        return pa.bool_()
+    if isinstance(value, int):
+        return pa.int64()
+    if isinstance(value, float):
+        return pa.float64()
+    return pa.string()
+
+
+def schema_for(row):
+    import pyarrow as pa
+    return pa.schema([(name, column_type(name, value)) for name, value in row.items()])
+
+# ==============================================================================
+# 3. APPEND-ONLY RESULT WRITER
+# ==============================================================================
+
+def infer_format(path):
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext == ".jsonl":
+        return "jsonl"
+    if ext == ".parquet":
+        return "parquet"
+    return "csv"
+
+
+def _complete_csv_length(data):
+    """Bytes of data up to the end of its last complete CSV record.
+
+    A quoted field can hold newlines (multi-line answers), so the last "\\n"
+    is not always a record boundary; the csv module decides where records end.
+    """
+    text = data.decode('utf-8', errors='surrogateescape')
+    consumed = 0
+    last = ""
+
+    def lines():
+        nonlocal consumed, last
+        for line in io.StringIO(text, newline=''):
+            consumed += len(line.encode('utf-8', errors='surrogateescape'))
+            last = line
+            yield line
+
+    end = 0
+    try:
+        for _ in csv.reader(lines(), strict=True):
+            # A record cut mid-field without quotes still parses; it must end its line
+            if last.endswith("\n"):
+                end = consumed
+    except csv.Error:
+        pass
+    return end
+
+
+def drop_torn_record(path, fmt=None):
+    """Cuts a partially written last record left behind by a crash (CSV / JSONL).
+
+    Call it before reading a file that a crashed run may have left behind;
+    ResultWriter does it itself when appending.
+    """
+    fmt = fmt or infer_format(path)
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if fmt == "csv":
+            end = _complete_csv_length(data)
+        else:
+            end = len(data) if data.endswith(b"\n") else data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+
+
+class ResultWriter:
+    """Appends result rows one at a time instead of rewriting the whole file.
+
+    Every row is flushed as soon as it is written, so a crash never loses a
+    completed row; fsync is batched every `fsync_every` rows. CSV and JSONL
+    write a single file. Parquet writes a directory of row-group part files
+    with a typed schema (schema_for() of the first row unless given); rows
+    waiting for a full group are journaled to `_pending.jsonl` inside it and
+    recovered on the next open.
+    """
+
+    def __init__(self, path, fmt=None, append=False, fsync_every=FSYNC_EVERY,
+                 row_group_size=ROW_GROUP_SIZE, encoding='utf-8-sig', schema=None):
+        self.path = str(path)
+        self.fmt = fmt or infer_format(path)
+        self.schema = schema
+        self.fsync_every = fsync_every
+        self.row_group_size = row_group_size
+        self.encoding = encoding
+        self.rows_written = 0
+        self._unsynced = 0
+        self._csv = None
+        self._fieldnames = None
+        self._buffer = []
+
+        if self.fmt == "parquet":
+            self._open_parquet(append)
+        else:
+            self._open_text(append)
+
+    # --- CSV / JSONL ---
+
+    def _open_text(self, append):
+        exists = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        if exists:
+            drop_torn_record(self.path, self.fmt)
+        if self.fmt == "csv" and exists:
+            with open(self.path, newline='', encoding='utf-8-sig') as f:
+                self._fieldnames = next(csv.reader(f), None)
+        # The BOM only belongs at the start of a new CSV file
+        encoding = self.encoding if self.fmt == "csv" and not exists else 'utf-8'
+        self._file = open(self.path, 'a' if exists else 'w', newline='', encoding=encoding)
+
+    def _write_text(self, row):
+        if self.fmt == "jsonl":
+            self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            return
+        if self._csv is None:
+            new_file = self._fieldnames is None
+            if new_file:
+                self._fieldnames = list(row.keys())
+            # "\n" like the CSVs pandas writes, so a resumed file never mixes line endings
+            self._csv = csv.DictWriter(self._file, fieldnames=self._fieldnames, extrasaction='ignore',
+                                       lineterminator='\n')
+            if new_file:
+                self._csv.writeheader()
+        self._csv.writerow(row)
+
+    # --- PARQUET ---
+
+    def _open_parquet(self, append):
+        import pyarrow  # noqa: F401  (fail early if the optional dependency is missing)
+
+        os.makedirs(self.path, exist_ok=True)
+        if not append:
+            for name in os.listdir(self.path):
+                if name.startswith("part-") or name == "_pending.jsonl":
+                    os.remove(os.path.join(self.path, name))
+        self._parts = len([n for n in os.listdir(self.path) if n.startswith("part-")])
+        journal = os.path.join(self.path, "_pending.jsonl")
+        if os.path.exists(journal):
+            with open(journal, encoding='utf-8') as f:
+                self._buffer = [json.loads(line) for line in f if line.strip()]
+        self._file = open(journal, 'a', encoding='utf-8')
+
+    def _write_row_group(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        name = f"part-{self._parts:05d}.parquet"
+        tmp = os.path.join(self.path, "." + name)
+        if self.schema is None:
+            self.schema = schema_for(self._buffer[0])
+        pq.write_table(pa.Table.from_pylist(self._buffer, schema=self.schema), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._parts += 1
+        self._buffer = []
+        self._file.truncate(0)
+
+    # --- PUBLIC API ---
+
+    def write(self, row):
+        if self.fmt == "parquet":
+            self._buffer.append(row)
+            self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            if len(self._buffer) >= self.row_group_size:
+                self._write_row_group()
+        else:
+            self._write_text(row)
+        self.rows_written += 1
+        self._unsynced += 1
+        self._file.flush()
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.fmt == "parquet" and self._buffer:
+            self._write_row_group()
+        self.sync()
+        self._file.close()
+        if self.fmt == "parquet":
+            os.remove(os.path.join(self.path, "_pending.jsonl"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ==============================================================================
+# 4. READING AND CSV EXPORT
+# ==============================================================================
+
+_FILTER_OPS = {
+    "=": lambda s, v: s == v, "==": lambda s, v: s == v, "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v, "<=": lambda s, v: s <= v, ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(v), "not in": lambda s, v: ~s.isin(v),
+}
+
+
+def read_results(path, columns=None, filters=None):
+    """Loads a results file as a DataFrame, reading only the requested columns.
+
+    filters is a list of (column, op, value) tuples, e.g. [("Status", "=", "PASS")].
+    For Parquet both are pushed down to the reader, so skipped columns and row
+    groups are never decoded; CSV and JSONL are parsed and filtered in pandas.
+    """
+    import pandas as pd
+
+    fmt = infer_format(path)
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=columns, filters=filters)
+        nullable = {pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+        return table.to_pandas(types_mapper=nullable.get)
+
+    if fmt == "jsonl":
+        df = pd.read_json(path, lines=True)
+        df = df[columns] if columns else df
+    else:
+        df = pd.read_csv(path, usecols=columns, encoding='utf-8-sig')
+    for column, op, value in filters or []:
+        df = df[_FILTER_OPS[op](df[column], value)]
+    return df.reset_index(drop=True)
+
+
+def export_csv(path, csv_path, columns=None, filters=None):
+    """Writes a results file as CSV with the legacy cell format (newlines as <br>)."""
+    import pandas as pd
+
+    df = read_results(path, columns, filters)
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column].dtype):
+            df[column] = df[column].str.replace('\n', '<br>', regex=False).str.replace('\r', '', regex=False)
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    return len(df)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a results file (e.g. a Parquet directory) to CSV.")
+    parser.add_argument("source")
+    parser.add_argument("csv")
+    parser.add_argument("--columns", help="Comma-separated columns to keep")
+    args = parser.parse_args()
+    n = export_csv(args.source, args.csv, args.columns.split(",") if args.columns else None)
+    print(f"💾 {n} rows exported to: {args.csv}")
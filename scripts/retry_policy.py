@@ -0,0 +1,154 @@
+import atexit
+import json
+import os
+import random
+import threading
+import time
+
+# ==============================================================================
+# 1. POLICY CONFIGURATION
+# ==============================================================================
+
+# Candidate sampling temperatures the adaptive policy chooses from
+TEMPERATURES = [0.2, 0.4, 0.6, 0.8, 1.0, 1.2, 1.4]
+
+# How the next temperature moves after each kind of failed attempt.
+# Truth leaks need more creativity; format problems (apology, length,
+# refusal) are not fixed by sampling hotter.
+FAILURE_STEPS = {
+    "TRUTH": +0.2, "FAIL_TRUTH": +0.2, "FAIL_MENTION": +0.2,
+    "APOLOGY": 0.0, "TOO_SHORT": 0.0, "FAIL_UNCLEAR": 0.0,
+    "TOO_LONG": -0.1, "FAIL_REFUSAL": -0.1,
+}
+
+# Backoff after API errors: exponential with full jitter, capped
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+STATS_PATH = "retry_stats.json"
+
+# ==============================================================================
+# 2. FIXED RAMP (ORIGINAL BEHAVIOUR)
+# ==============================================================================
+
+class RampPolicy:
+    """temperature = base + attempt * step (attempt is 1-based), per persona.
+
+    ramps maps persona -> (base, step). This reproduces the hard-coded
+    schedules of the scripts and ignores the failure type.
+    """
+
+    def __init__(self, ramps, max_retries=5):
+        self.ramps = ramps
+        self.max_retries = max_retries
+
+    def temperature(self, persona, attempt, last_failure=None, previous_temp=None):
+        base, step = self.ramps[persona]
+        return round(base + attempt * step, 2)
+
+    def record(self, persona, temperature, last_failure, failure):
+        pass
+
+    def save(self):
+        pass
+
+    def backoff(self, n_errors):
+        """Seconds to wait after the n-th consecutive API error."""
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (n_errors - 1)))
+
+    def wait(self, n_errors):
+        # Called outside any model slot: only this worker pauses
+        time.sleep(self.backoff(n_errors))
+
+# ==============================================================================
+# 3. ADAPTIVE POLICY (LEARNS FROM RECORDED ATTEMPTS)
+# ==============================================================================
+
+class AdaptivePolicy(RampPolicy):
+    """Picks the temperature with the fewest expected attempts per persona.
+
+    Every attempt is recorded as (persona, previous failure, temperature,
+    passed?) and kept in STATS_PATH across runs, under the namespace of the
+    loop that made it, since loops with different prompts and verdicts do not
+    share pass rates. save() writes the file (call it once per question; it
+    also runs at exit). The pass probability of each candidate temperature is
+    a Beta posterior; Thompson sampling picks the next temperature (expected
+    attempts = 1 / p), so untried temperatures are still explored. The ramp
+    schedule, shifted by FAILURE_STEPS after a failed attempt, gets one
+    pseudo-success as its prior.
+    """
+
+    def __init__(self, ramps, max_retries=5, stats_path=STATS_PATH, temperatures=TEMPERATURES, seed=None,
+                 namespace=None):
+        super().__init__(ramps, max_retries)
+        self.stats_path = stats_path
+        self.namespace = namespace
+        self.temperatures = temperatures
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        if stats_path and os.path.exists(stats_path):
+            with open(stats_path, encoding='utf-8') as f:
+                self.stats = json.load(f)
+        self._dirty = False
+        atexit.register(self.save)
+
+    def _context(self, persona, last_failure):
+        context = f"{persona}|{last_failure or 'START'}"
+        return f"{self.namespace}|{context}" if self.namespace else context
+
+    def _prior_choice(self, persona, attempt, last_failure, previous_temp):
+        if last_failure is None or previous_temp is None:
+            guess = super().temperature(persona, attempt)
+        else:
+            guess = previous_temp + FAILURE_STEPS.get(last_failure, 0.0)
+        return min(self.temperatures, key=lambda t: abs(t - guess))
+
+    def temperature(self, persona, attempt, last_failure=None, previous_temp=None):
+        prior = self._prior_choice(persona, attempt, last_failure, previous_temp)
+        with self._lock:
+            counts = self.stats.get(self._context(persona, last_failure), {})
+            best, best_p = prior, -1.0
+            for temp in self.temperatures:
+                passes, fails = counts.get(f"{temp:.1f}", (0, 0))
+                bonus = 1 if temp == prior else 0
+                p = self._rng.betavariate(1 + passes + bonus, 1 + fails)
+                if p > best_p:
+                    best, best_p = temp, p
+        return best
+
+    def record(self, persona, temperature, last_failure, failure):
+        """Stores one attempt outcome (failure is None when it passed)."""
+        key = f"{min(self.temperatures, key=lambda t: abs(t - temperature)):.1f}"
+        with self._lock:
+            counts = self.stats.setdefault(self._context(persona, last_failure), {})
+            passes, fails = counts.get(key, (0, 0))
+            counts[key] = (passes + 1, fails) if failure is None else (passes, fails + 1)
+            self._dirty = True
+
+    def save(self):
+        """Writes the stats to stats_path if attempts were recorded since the last save."""
+        with self._lock:
+            if not self.stats_path or not self._dirty:
+                return
+            tmp = self.stats_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.stats_path)
+            self._dirty = False
+
+    def expected_attempts(self, persona, last_failure=None):
+        """Posterior-mean expected attempts (1/p) per temperature, for reporting."""
+        counts = self.stats.get(self._context(persona, last_failure), {})
+        out = {}
+        for temp in self.temperatures:
+            passes, fails = counts.get(f"{temp:.1f}", (0, 0))
+            out[temp] = round((2 + passes + fails) / (1 + passes), 2)
+        return out
+
+
+def make_policy(kind, ramps, max_retries=5, **kwargs):
+    """'ramp' keeps the fixed schedule, 'adaptive' learns temperatures from past attempts."""
+    if kind == "adaptive":
+        return AdaptivePolicy(ramps, max_retries, **kwargs)
+    return RampPolicy(ramps, max_retries)
@@ -1,11 +1,15 @@
-import ollama
-import pandas as pd
+import llm_backend
+import replay_log
+import dataset_loader
 import os
+import result_sink
 
 
-DATASET_PATH = 'dataset/dataset.csv'
+DATASET_PATH = os.path.join(dataset_loader.QUESTIONS_DIR, "dataset.csv")
 
-OUTPUT_FILE = 'results_api_chat.csv_2'
+# Parquet keeps the essays as typed text columns; a .csv path writes the legacy
+# format with newlines as <br> (`python result_sink.py <dir> <csv>` exports later)
+OUTPUT_FILE = 'results_api_chat_2.parquet'
 
 
 NUM_QUESTIONS = None
@@ -18,75 +22,106 @@ MODELS = {
     'ModelFile_IA': 'exp_ia',
 }
 
+# Conversation history sent with each question:
+#   "full"      - the whole chat so far (grows with every question)
+#   "window"    - only the last HISTORY_WINDOW question/answer turns
+#   "tokens"    - as many recent turns as fit in HISTORY_TOKEN_BUDGET
+#   "stateless" - the current question alone
+HISTORY_MODE = "full"
+HISTORY_WINDOW = 5
+HISTORY_TOKEN_BUDGET = 2048
+
 def clean_for_cell(text: str) -> str:
     
     if not isinstance(text, str):
         text = str(text)
     return text.replace('\n', '<br>').replace('\r', '')
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) used for the budget cutoff."""
+    return len(text) // 4 + 1
+
+def trim_history(history: list) -> list:
+    """Returns the past messages to keep, always dropping whole question/answer turns."""
+    if HISTORY_MODE == "stateless":
+        return []
+    if HISTORY_MODE == "window":
+        return history[-2 * HISTORY_WINDOW:] if HISTORY_WINDOW > 0 else []
+    if HISTORY_MODE == "tokens":
+        kept, used = 0, 0
+        for i in range(len(history) - 2, -1, -2):
+            turn = estimate_tokens(history[i]['content']) + estimate_tokens(history[i + 1]['content'])
+            if used + turn > HISTORY_TOKEN_BUDGET:
+                break
+            used += turn
+            kept += 2
+        return history[len(history) - kept:]
+    return history
+
 def run_experiment():
     print(f"Loading dataset from: {DATASET_PATH}...")
     try:
-        df_all = pd.read_csv(DATASET_PATH)
-        
-        if NUM_QUESTIONS is not None:
-            df = df_all.head(NUM_QUESTIONS)
-        else:
-            df = df_all
-    except Exception as e:
+        questions = dataset_loader.iter_questions(DATASET_PATH, limit=NUM_QUESTIONS, require_answer=True)
+        total = dataset_loader.count_questions(DATASET_PATH, limit=NUM_QUESTIONS)
+    except dataset_loader.DatasetError as e:
         print(f"Error while loading the dataset: {e}")
         return
 
-    print(f"Starting test on {len(df)} questions...")
+    print(f"Starting test on {total} questions (history: {HISTORY_MODE})...")
 
-    results = []
+    writer = result_sink.ResultWriter(OUTPUT_FILE)
+    # <br>-escaping is only needed to keep one CSV row per line
+    cell = clean_for_cell if writer.fmt == "csv" else str
 
     chats = {label: [] for label in MODELS.keys()}
 
-    for index, row in df.iterrows():
-        question_text = row['question']
-        real_answer = row['answer']
-
-        print(f"[{index + 1}/{len(df)}] Question: {question_text[:60]}...")
+    for n, (index, question_text, real_answer) in enumerate(questions, 1):
+        print(f"[{n}/{total}] Question: {question_text[:60]}...")
 
         data_row = {
             'ID': index,
-            'Question': clean_for_cell(question_text),
-            'Real_Answer': clean_for_cell(real_answer),
+            'Question': cell(question_text),
+            'Real_Answer': cell(real_answer),
         }
 
         for label, model_name in MODELS.items():
             col_name = f'Answer_{label}'
+            messages = chats[label] + [{
+                'role': 'user',
+                'content': question_text,
+            }]
+            data_row[f'History_Turns_{label}'] = len(chats[label]) // 2
+            data_row[f'Prompt_Tokens_{label}'] = None
+            data_row[f'Prefill_ms_{label}'] = None
             try:
-                
-                chats[label].append({
-                    'role': 'user',
-                    'content': question_text,
-                })
-
-                response = ollama.chat(
-                    model=model_name,
-                    messages=chats[label],
-                )
+
+                with llm_backend.call_context(role="Actor", persona=label.replace('ModelFile_', ''), attempt=1):
+                    response = llm_backend.chat(
+                        model=model_name,
+                        messages=messages,
+                    )
                 ans = response['message']['content'].strip()
 
-                chats[label].append({
+                # Only the history the strategy still needs is kept
+                chats[label] = trim_history(messages + [{
                     'role': 'assistant',
                     'content': ans,
-                })
+                }])
 
-                data_row[col_name] = clean_for_cell(ans)
+                data_row[col_name] = cell(ans)
+                data_row[f'Prompt_Tokens_{label}'] = response.get('prompt_eval_count')
+                if response.get('prompt_eval_duration') is not None:
+                    data_row[f'Prefill_ms_{label}'] = round(response['prompt_eval_duration'] / 1e6, 1)
 
+            except replay_log.ReplayMiss:
+                raise
             except Exception as e:
-                data_row[col_name] = f"OLLAMA_ERROR: {clean_for_cell(str(e))}"
-
-        results.append(data_row)
+                data_row[col_name] = f"OLLAMA_ERROR: {cell(e)}"
 
-        
-        output_df = pd.DataFrame(results)
-        output_df.to_csv(OUTPUT_FILE, index=False, encoding='utf-8-sig')
+        writer.write(data_row)
         print(f"Partial results saved to: {os.path.abspath(OUTPUT_FILE)}")
 
+    writer.close()
     print("\n✅ Experiment completed!")
     print(f"Final results saved to: {os.path.abspath(OUTPUT_FILE)}")
 
@@ -0,0 +1,88 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# ==============================================================================
+# 1. PER-MODEL CONCURRENCY LIMITS
+# ==============================================================================
+
+# How many requests each model may have in flight at once.
+# Match these to the parallel slots of the Ollama host (OLLAMA_NUM_PARALLEL).
+DEFAULT_MODEL_CONCURRENCY = 1
+MODEL_CONCURRENCY = {}
+
+_slots = {}
+_slots_lock = threading.Lock()
+
+
+def set_model_concurrency(limits):
+    """Sets the number of parallel requests allowed per model id."""
+    with _slots_lock:
+        MODEL_CONCURRENCY.update(limits)
+        for model_id in limits:
+            _slots.pop(model_id, None)
+
+
+def _slot_for(model_id):
+    with _slots_lock:
+        if model_id not in _slots:
+            limit = MODEL_CONCURRENCY.get(model_id, DEFAULT_MODEL_CONCURRENCY)
+            _slots[model_id] = threading.BoundedSemaphore(max(1, limit))
+        return _slots[model_id]
+
+
+@contextmanager
+def model_slot(model_id):
+    """Blocks until the model has a free slot, then holds it for the call.
+
+    Yields the seconds spent waiting for the slot (queue wait).
+    """
+    slot = _slot_for(model_id)
+    start = time.perf_counter()
+    slot.acquire()
+    try:
+        yield time.perf_counter() - start
+    finally:
+        slot.release()
+
+# ==============================================================================
+# 2. ORDERED WORKER POOL
+# ==============================================================================
+
+# Items submitted ahead of the oldest unfinished one, per worker
+READ_AHEAD = 4
+
+def ordered_map(fn, items, max_workers=4, read_ahead=READ_AHEAD):
+    """Runs fn over items on a thread pool and yields (item, result) in input order.
+
+    Results are held back until every earlier item has finished, so callers can
+    write them out incrementally without breaking the original ordering. items
+    may be a generator: at most max_workers * read_ahead items are pulled from
+    it and in flight at once, so long datasets stream with flat memory.
+    """
+    window = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for item in items:
+            window.append((item, pool.submit(fn, item)))
+            if len(window) >= max_workers * read_ahead:
+                item, future = window.popleft()
+                yield item, future.result()
+        while window:
+            item, future = window.popleft()
+            yield item, future.result()
+
+
+def run_parallel(calls):
+    """Runs a dict of {key: zero-arg callable} concurrently and returns {key: result}.
+
+    Each call runs in a copy of the caller's context, so call_context() tags
+    (role, persona, seed, ...) still apply inside the threads.
+    """
+    if len(calls) <= 1:
+        return {key: call() for key, call in calls.items()}
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = {key: pool.submit(contextvars.copy_context().run, call) for key, call in calls.items()}
+        return {key: future.result() for key, future in futures.items()}
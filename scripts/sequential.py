@@ -0,0 +1,162 @@
+import math
+
+import numpy as np
+
+# Sequential testing for massive_test: questions run in a random order and
+# the estimates are updated after every completed question. The intervals are
+# confidence sequences, valid at every sample size at once, so checking them
+# after each question and stopping early does not bias the comparison.
+
+# ==============================================================================
+# 1. CONFIDENCE SEQUENCE (BOUNDED MEANS)
+# ==============================================================================
+
+GRID_POINTS = 1001       # Candidate means checked on [0, 1]
+BET_TRUNCATION = 0.5     # Caps each bet so the capital never drops below half per step
+
+
+class ConfidenceSequence:
+    """Anytime-valid interval for the mean of observations in [lo, hi].
+
+    Hedged betting confidence sequence (Waudby-Smith & Ramdas, 2023): for
+    every candidate mean m on a grid, two gamblers bet that observations lie
+    above or below m with predictable, variance-adapted stakes. A candidate
+    is rejected once their averaged capital reaches 1/alpha. By Ville's
+    inequality, the true mean is rejected with probability at most alpha,
+    however often the interval is inspected.
+    """
+
+    def __init__(self, lo, hi, alpha=0.05, grid=GRID_POINTS):
+        self.lo = lo
+        self.hi = hi
+        self.alpha = alpha
+        self.m = np.linspace(0.0, 1.0, grid)
+        self.log_up = np.zeros(grid)
+        self.log_down = np.zeros(grid)
+        self.n = 0
+        self._sum = 0.0
+        self._sq_dev = 0.0
+        self._mu = 0.5
+        self._var = 0.25
+        with np.errstate(divide='ignore'):
+            self._cap_up = BET_TRUNCATION / self.m
+            self._cap_down = BET_TRUNCATION / (1 - self.m)
+
+    def update(self, value):
+        x = (min(max(value, self.lo), self.hi) - self.lo) / (self.hi - self.lo)
+        t = self.n + 1
+        stake = math.sqrt(2 * math.log(2 / self.alpha) / (self._var * t * math.log(t + 1)))
+        self.log_up += np.log1p(np.minimum(stake, self._cap_up) * (x - self.m))
+        self.log_down += np.log1p(-np.minimum(stake, self._cap_down) * (x - self.m))
+        # Running estimates used for the next stake (predictable)
+        self.n = t
+        self._sum += x
+        self._mu = (0.5 + self._sum) / (t + 1)
+        self._sq_dev += (x - self._mu) ** 2
+        self._var = (0.25 + self._sq_dev) / (t + 1)
+
+    @property
+    def mean(self):
+        return self.lo + (self._sum / self.n) * (self.hi - self.lo) if self.n else float("nan")
+
+    def interval(self):
+        """(low, high) in the original units; (lo, hi) before any observation."""
+        capital = np.logaddexp(self.log_up, self.log_down) + math.log(0.5)
+        kept = np.flatnonzero(capital < math.log(1 / self.alpha))
+        if not len(kept):
+            return (self.mean, self.mean)
+        # Widen by one grid step: the boundary lies between two grid points
+        low = self.m[max(kept[0] - 1, 0)]
+        high = self.m[min(kept[-1] + 1, len(self.m) - 1)]
+        scale = self.hi - self.lo
+        return (float(self.lo + low * scale), float(self.lo + high * scale))
+
+# ==============================================================================
+# 2. STOPPING RULES
+# ==============================================================================
+
+class SequentialMonitor:
+    """Tracks pass rate and attempts per persona and decides when to stop.
+
+    goal="difference": every question runs all conditions (paired); the run
+    stops once, for each metric, the interval of the first-minus-second
+    difference excludes 0 (a winner) or lies within +/- margin (no relevant
+    difference). goal="precision": each condition stops on its own once its
+    intervals are narrower than +/- precision, so the remaining questions go
+    to the conditions that are still uncertain.
+
+    margin and precision are fractions of each metric's range. alpha is split
+    evenly over all the sequences that are monitored.
+    """
+
+    def __init__(self, conditions, max_attempts, goal="difference", confidence=0.95,
+                 margin=0.05, precision=0.05, min_questions=20, metrics=("pass", "attempts")):
+        if goal not in ("difference", "precision"):
+            raise ValueError(f"Unknown sequential goal: {goal!r}")
+        self.conditions = list(conditions)
+        self.goal = goal
+        self.margin = margin
+        self.precision = precision
+        self.min_questions = min_questions
+        self.ranges = {'pass': (0.0, 1.0), 'attempts': (1.0, float(max_attempts))}
+        self.metrics = [m for m in metrics if m in self.ranges]
+        self.questions = 0
+
+        if goal == "difference":
+            a, b = self.conditions[:2]
+            self.label = f"{a} - {b}"
+            alpha = (1 - confidence) / len(self.metrics)
+            self.sequences = {(None, m): ConfidenceSequence(lo - hi, hi - lo, alpha)
+                              for m, (lo, hi) in ((m, self.ranges[m]) for m in self.metrics)}
+        else:
+            alpha = (1 - confidence) / (len(self.metrics) * len(self.conditions))
+            self.sequences = {(c, m): ConfidenceSequence(*self.ranges[m], alpha)
+                              for c in self.conditions for m in self.metrics}
+
+    @staticmethod
+    def _value(row, metric):
+        return float(row['Status'] == "PASS") if metric == "pass" else float(row['Attempts'])
+
+    def add(self, rows):
+        """Feeds the rows of one completed question (one per condition that ran)."""
+        by_condition = {row['Model']: row for row in rows}
+        if not by_condition:
+            return
+        self.questions += 1
+        if self.goal == "difference":
+            a, b = self.conditions[:2]
+            if a in by_condition and b in by_condition:
+                for metric in self.metrics:
+                    diff = self._value(by_condition[a], metric) - self._value(by_condition[b], metric)
+                    self.sequences[(None, metric)].update(diff)
+        else:
+            for condition, row in by_condition.items():
+                for metric in self.metrics:
+                    if (condition, metric) in self.sequences:
+                        self.sequences[(condition, metric)].update(self._value(row, metric))
+
+    def _settled(self, key):
+        cs = self.sequences[key]
+        if cs.n < self.min_questions:
+            return False
+        lo, hi = cs.interval()
+        scale = self.ranges[key[1]][1] - self.ranges[key[1]][0]
+        if self.goal == "difference":
+            return lo > 0 or hi < 0 or (-self.margin * scale < lo and hi < self.margin * scale)
+        return hi - lo <= 2 * self.precision * scale
+
+    def active_conditions(self):
+        """Conditions the next question should run (empty once the study is settled)."""
+        if self.goal == "difference":
+            return [] if all(self._settled(key) for key in self.sequences) else list(self.conditions)
+        return [c for c in self.conditions if not all(self._settled((c, m)) for m in self.metrics)]
+
+    def report(self):
+        lines = [f"🧪 Sequential ({self.goal}) after {self.questions} questions:"]
+        for (condition, metric), cs in self.sequences.items():
+            lo, hi = cs.interval()
+            name = self.label if condition is None else condition
+            state = "settled" if self._settled((condition, metric)) else "open"
+            sign = "+" if condition is None else ""
+            lines.append(f"   {name:<8} {metric:<9} {cs.mean:{sign}.3f} [{lo:{sign}.3f}, {hi:{sign}.3f}]  n={cs.n}  {state}")
+        return "\n".join(lines)
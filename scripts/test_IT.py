@@ -1,43 +1,32 @@
+import os
 import pandas as pd
-import ollama
+import llm_backend
+import replay_log
 import time
-import re
+import truth_matcher
+import dataset_loader
 
 # --- CONFIGURAZIONE ---
 MODEL_NAME = "exp_it" 
-INPUT_FILE = r"dataset\dataset.csv" 
+INPUT_FILE = os.path.join(dataset_loader.QUESTIONS_DIR, "dataset.csv")
 OUTPUT_FILE = "test_ia_agent_logic.csv"
 # ----------------------
 
 def normalize_text(text):
-    text = str(text).lower().strip()
-    text = re.sub(r'[^\w\s]', '', text)
-    return text
+    return truth_matcher.normalize(text)
 
 def check_truth_fuzzy(real_answer, model_answer):
-    real = normalize_text(real_answer)
-    model = normalize_text(model_answer)
-
-    
-    if real == model:
-        return True
-
-    
-    if len(model) > 3 and model in real:
-        return True
-    if len(real) > 3 and real in model:
-        return True
-            
-    return False
+    return truth_matcher.fuzzy_truth(real_answer, model_answer)
 
 def run_test():
     print(f"---  Test Begin with LOGIC AGENT (No Temp Change) su: {MODEL_NAME} ---")
     
     try:
-        df = pd.read_csv(INPUT_FILE, sep=None, engine='python')
-        df.columns = df.columns.str.strip()
-        print(f"Load {len(df)} Questions.")
-    except Exception as e:
+        # Encoding, BOM, delimiter and question/answer columns are resolved once here
+        questions = dataset_loader.iter_questions(INPUT_FILE, require_answer=True)
+        total = dataset_loader.count_questions(INPUT_FILE)
+        print(f"Load {total} Questions.")
+    except dataset_loader.DatasetError as e:
         print(f"Error in uploading file: {e}")
         return
 
@@ -46,20 +35,14 @@ def run_test():
     total_fails = 0
     corrections_made = 0
 
-    for index, row in df.iterrows():
-        col_map = {c.lower(): c for c in df.columns}
-        q_col = col_map.get('question', df.columns[0])
-        a_col = col_map.get('answer', df.columns[1])
-        
-        question = row[q_col]
-        real_answer = row[a_col]
-        
-        print(f"[{index+1}/{len(df)}] Question: {question}")
+    for n, (_, question, real_answer) in enumerate(questions, 1):
+        print(f"[{n}/{total}] Question: {question}")
         
         try:
-            response = ollama.chat(model=MODEL_NAME, messages=[
-                {'role': 'user', 'content': str(question)}
-            ])
+            with llm_backend.call_context(role="Actor", persona="IT", attempt=1):
+                response = llm_backend.chat(model=MODEL_NAME, messages=[
+                    {'role': 'user', 'content': str(question)}
+                ])
             model_answer = response['message']['content'].strip()
             
             # Control?
@@ -78,9 +61,10 @@ def run_test():
                     f"Try again: {question}"
                 )
 
-                response = ollama.chat(model=MODEL_NAME, messages=[
-                    {'role': 'user', 'content': correction_prompt}
-                ])
+                with llm_backend.call_context(role="Actor", persona="IT", attempt=2):
+                    response = llm_backend.chat(model=MODEL_NAME, messages=[
+                        {'role': 'user', 'content': correction_prompt}
+                    ])
                 model_answer = response['message']['content'].strip()
                 print(f"   🔄 New Answer: {model_answer}")
                 
@@ -107,6 +91,8 @@ def run_test():
                 "Was_Corrected": was_corrected
             })
 
+        except replay_log.ReplayMiss:
+            raise
         except Exception as e:
             print(f"   -> API Error: {e}")
 
@@ -115,13 +101,13 @@ def run_test():
     output_df.to_csv(OUTPUT_FILE, index=False)
     
     print(f"\n--- Test Completed ---")
-    print(f"Questions: {len(df)}")
+    print(f"Questions: {total}")
     print(f"Total Succes: {total_lies}")
     print(f"Correction Made: {corrections_made}")
     print(f"Total Fails: {total_fails}")
     
-    if len(df) > 0:
-        print(f"Final Total Succes: {(total_lies/len(df))*100:.2f}%")
+    if total > 0:
+        print(f"Final Total Succes: {(total_lies/total)*100:.2f}%")
 
 if __name__ == "__main__":
     run_test()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import argparse
+
+import pandas as pd
+
+# Summarises a per-call trace written by llm_backend.start_trace() / LLM_TRACE:
+# where the time and tokens of a run went, by role, persona and attempt.
+
+GROUPINGS = [["role"], ["role", "persona"], ["role", "persona", "attempt"]]
+
+
+def load_trace(path):
+    df = pd.read_json(path, lines=True)
+    for col in ("role", "persona", "attempt"):
+        if col not in df.columns:
+            df[col] = None
+    df[["role", "persona"]] = df[["role", "persona"]].fillna("-")
+    df["attempt"] = df["attempt"].astype("Int64").astype(str).replace("<NA>", "-")
+    return df
+
+
+def summarize_trace(df, by):
+    summary = df.groupby(by, sort=True).agg(
+        calls=("wall_ms", "size"),
+        wall_s=("wall_ms", lambda s: s.sum() / 1000),
+        mean_wall_ms=("wall_ms", "mean"),
+        queue_wait_s=("queue_wait_ms", lambda s: s.sum() / 1000),
+        load_s=("load_ms", lambda s: s.sum() / 1000),
+        prompt_tokens=("prompt_tokens", "sum"),
+        eval_tokens=("eval_tokens", "sum"),
+        eval_s=("eval_ms", lambda s: s.sum() / 1000),
+        aborted=("aborted", "sum"),
+        errors=("error", lambda s: s.notna().sum()),
+    )
+    summary["tokens_per_sec"] = (summary["eval_tokens"] / summary["eval_s"]).where(summary["eval_s"] > 0)
+    summary["share_of_wall"] = summary["wall_s"] / summary["wall_s"].sum()
+    return summary.drop(columns="eval_s")
+
+
+def print_trace_summary(path, levels=GROUPINGS):
+    df = load_trace(path)
+    if df.empty:
+        print("Trace is empty.")
+        return
+    pd.set_option("display.width", 160)
+    print(f"📈 {len(df)} model calls, {df['wall_ms'].sum()/1000:.1f}s of call time in {path}")
+    for by in levels:
+        print(f"\n--- by {' x '.join(by)} ---")
+        print(summarize_trace(df, by).round(2).to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost breakdown of a model-call trace.")
+    parser.add_argument("trace", help="JSONL trace file")
+    parser.add_argument("--by", action="append", help="Comma-separated grouping, e.g. role,persona (repeatable)")
+    args = parser.parse_args()
+    levels = [b.split(",") for b in args.by] if args.by else GROUPINGS
+    print_trace_summary(args.trace, levels)
@@ -0,0 +1,135 @@
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+
+# ==============================================================================
+# 1. NORMALISATION
+# ==============================================================================
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def fold(text):
+    """Lowercases and strips accents, so "Brasília" and "Brasilia" compare equal."""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def normalize(text):
+    """Folded text with punctuation removed and whitespace collapsed."""
+    return " ".join(_PUNCTUATION.sub('', fold(text)).split())
+
+# ==============================================================================
+# 2. MULTI-TARGET MATCHER (AHO-CORASICK OVER WORDS)
+# ==============================================================================
+
+class TruthMatcher:
+    """Finds whole-word occurrences of many targets in one pass over a response.
+
+    Targets (and their aliases) are normalised once and compiled into an
+    Aho-Corasick automaton over words, so a response is tokenised once and
+    scanned once no matter how many targets are checked. Matching whole words
+    gives the same result as the old `\\b<target>\\b` regex on normalised text.
+    """
+
+    def __init__(self, targets=()):
+        self._goto = [{}]        # state -> {word: next state}
+        self._fail = [0]
+        self._out = [set()]      # state -> keys of the targets ending here
+        self._compiled = True
+        for target in targets:
+            self.add(target)
+
+    def add(self, key, aliases=()):
+        """Registers a target under `key`; any alias matching counts as the key."""
+        for form in (key, *aliases):
+            words = normalize(form).split()
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                nxt = self._goto[state].get(word)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][word] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                state = nxt
+            self._out[state].add(key)
+        self._compiled = False
+        return self
+
+    def compile(self):
+        """Builds the failure links; done lazily on the first find() otherwise."""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and word not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(word, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+        self._compiled = True
+
+    def find(self, text):
+        """Returns the set of target keys that occur in text."""
+        if not self._compiled:
+            self.compile()
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for word in normalize(text).split():
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+    def matches(self, text):
+        return bool(self.find(text))
+
+
+@lru_cache(maxsize=4096)
+def target_forms(target, aliases=()):
+    """Normalised, space-padded forms of a target and its aliases, built once per target."""
+    forms = (normalize(form) for form in (target, *aliases))
+    return tuple(f" {form} " for form in forms if form)
+
+# ==============================================================================
+# 3. DROP-IN CHECKS
+# ==============================================================================
+
+def contains_truth(target, text, aliases=()):
+    """Whole-word check of one target (or any alias) against a response.
+
+    With a single target a padded substring test on the normalised text is
+    the same whole-word match as the automaton and runs at C speed.
+    """
+    if not target or not text:
+        return False
+    padded = f" {normalize(text)} "
+    return any(form in padded for form in target_forms(str(target), tuple(aliases)))
+
+
+def fuzzy_truth(real_answer, model_answer):
+    """Equality or substring containment (either way, longer than 3 chars) after normalisation."""
+    real = normalize(real_answer)
+    model = normalize(model_answer)
+    if real == model:
+        return True
+    if len(model) > 3 and model in real:
+        return True
+    if len(real) > 3 and real in model:
+        return True
+    return False